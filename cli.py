@@ -21,15 +21,37 @@ def main():
     parser.add_argument(
         "-k", "--contours", action="store_true", help="Enable contour detection"
     )
+    parser.add_argument(
+        "--no-track",
+        action="store_true",
+        help="Disable circle tracking in live mode (search every frame from scratch)",
+    )
+    parser.add_argument(
+        "--stages",
+        type=lambda s: tuple(stage.strip() for stage in s.split(",")),
+        default=None,
+        help=(
+            "Comma-separated pipeline stages to allow (default: PIPELINE_STAGES "
+            "from config), e.g. contours,annotate; capture, preprocess, "
+            "circles and color always run"
+        ),
+    )
     parser.add_argument("--ip", type=str, default="127.0.0.1", help="PLC IP address")
     args = parser.parse_args()
 
     if args.live:
         print("Uruchamianie wizji live...")
-        wizja_live(contours=args.contours, circles=args.circles)
+        wizja_live(
+            contours=args.contours,
+            circles=args.circles,
+            track=not args.no_track,
+            stages=args.stages,
+        )
     elif args.static:
         print("Uruchamianie wizji statycznej...")
-        reponse = wizja_still(contours=args.contours, circles=args.circles)
+        reponse = wizja_still(
+            contours=args.contours, circles=args.circles, stages=args.stages
+        )
         print("Wynik analizy:", reponse)
         # input('Naciśnij Enter, aby zakończyć...')
     elif args.plc:
@@ -5,6 +5,7 @@ from src.routes.annotated_images import router as annotated_images_router
 from src.routes.api import router as api_router
 from src.routes.camera import router as camera_router
 from src.routes.logs import router as logs_router
+from src.routes.metrics import router as metrics_router
 from src.routes.spa import router as spa_router
 from src.static_assets import configure_static
 
@@ -19,6 +20,7 @@ app.add_middleware(
 
 app.include_router(api_router)
 app.include_router(logs_router)
+app.include_router(metrics_router)
 app.include_router(camera_router)
 app.include_router(annotated_images_router)
 configure_static(app)
@@ -1,12 +1,7 @@
 import cv2 as cv
 import numpy as np
 
-from .config import (
-    FRAME_LEFT_MARGIN,
-    FRAME_TOP_MARGIN,
-    FRAME_RIGHT_MARGIN,
-    FRAME_BOTTOM_MARGIN,
-)
+from .preprocessing import PreparedFrame
 
 
 def put_text_with_shadow(
@@ -41,12 +36,12 @@ def put_text_with_shadow(
     )
 
 
-def annotate_frame(frame, data):
+def annotate_frame(frame, data, prepared=None):
 
     # Frame size annotations
-    frame_h, frame_w = frame.shape[:2]
-    FRAME_WIDTH = frame_w - FRAME_LEFT_MARGIN - FRAME_RIGHT_MARGIN
-    FRAME_HEIGHT = frame_h - FRAME_TOP_MARGIN - FRAME_BOTTOM_MARGIN
+    if prepared is None:
+        prepared = PreparedFrame(frame)
+    FRAME_LEFT_MARGIN, FRAME_TOP_MARGIN, FRAME_WIDTH, FRAME_HEIGHT = prepared.roi
     cv.rectangle(
         frame,
         (FRAME_LEFT_MARGIN, FRAME_TOP_MARGIN),
@@ -70,9 +65,12 @@ def annotate_frame(frame, data):
         rect_bottom_right = (a + OFFSET_X + SIZE, b - OFFSET_Y + SIZE)
         cv.circle(frame, (a, b), r, (0, 255, 0), 2)
         cv.circle(frame, (a, b), 1, (0, 0, 255), 3)
+        label = f"{color}, r: {r}, HSV:{[int(round(x)) for x in average]}"
+        if "id" in circle:
+            label = f"#{circle['id']} {label}"
         cv.putText(
             frame,
-            f"{color}, r: {r}, HSV:{[int(round(x)) for x in average]}",
+            label,
             (a, b),
             1,
             1,
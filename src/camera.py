@@ -1,6 +1,19 @@
 # app/camera.py
 import cv2 as cv
-import threading, asyncio, os
+import threading, os, time
+
+from .config import (
+    CAMERA_ANALYSIS_SIZE,
+    CAMERA_PREVIEW_SIZE,
+    CAMERA_FPS,
+    CAMERA_RING_SIZE,
+    CAMERA_FRAME_TIMEOUT,
+    CAMERA_JPEG_QUALITY,
+)
+from .frame_ring import FrameRing
+from .metrics import metrics
+from .mjpeg import MjpegBroadcaster
+from .replay import ReplaySource
 
 os.environ["LIBCAMERA_LOG_LEVELS"] = (
     "*:2"  # Ustawienie poziomu logowania dla libcamera, aby uniknąć nadmiaru informacji w konsoli
@@ -14,57 +27,178 @@ except ImportError:
     PICAMERA_AVAILABLE = False
 
 
+def camera_backend(backend=None):
+    """Nazwa backendu kamery: argument, zmienna CAMERA_BACKEND albo wykrycie
+    ("picamera2" gdy biblioteka jest dostępna, w przeciwnym razie "opencv")."""
+    backend = (backend or os.getenv("CAMERA_BACKEND", "auto")).strip().lower()
+    if backend == "auto":
+        return "picamera2" if PICAMERA_AVAILABLE else "opencv"
+    if backend not in ("picamera2", "opencv", "replay"):
+        raise RuntimeError(f"Nieznany backend kamery: {backend}")
+    return backend
+
+
+def encode_preview(frame, preview_size, preview=None):
+    """JPEG podglądu klatki (bajty) albo None. `preview` to gotowy strumień
+    lores (YUV420) z kamery; bez niego klatka jest skalowana do `preview_size`."""
+    if preview is not None:
+        image = cv.cvtColor(preview, cv.COLOR_YUV2BGR_I420)
+    elif (frame.shape[1], frame.shape[0]) != tuple(preview_size):
+        image = cv.resize(frame, tuple(preview_size), interpolation=cv.INTER_AREA)
+    else:
+        image = frame
+    ok, jpg = cv.imencode(
+        ".jpg", image, [int(cv.IMWRITE_JPEG_QUALITY), CAMERA_JPEG_QUALITY]
+    )
+    return jpg.tobytes() if ok else None
+
+
 class Camera:
-    def __init__(self, width=640, height=360, fps=30):
+    """Kamera z dwoma strumieniami: pełnym do analizy (bufor `frames`)
+    i małym podglądem MJPEG, liczonym tylko gdy ktoś go ogląda."""
+
+    def __init__(
+        self,
+        size=CAMERA_ANALYSIS_SIZE,
+        preview_size=CAMERA_PREVIEW_SIZE,
+        fps=CAMERA_FPS,
+        backend=None,
+    ):
+        width, height = size
+        self.size = tuple(size)
+        self.preview_size = tuple(preview_size)
         self.lock = threading.Lock()
         self.frame: bytes | None = None
+        self.frame_seq = -1  # numer klatki, z której pochodzi self.frame
+        self._jpeg_lock = threading.Lock()
         self.running = True
         self._released = False
         self.boundary = b"frame"
+        self.broadcaster = MjpegBroadcaster(self.boundary)
+        # Surowe klatki z wątku czytającego - analiza bierze je stąd bez czekania
+        self.frames = FrameRing(CAMERA_RING_SIZE)
 
-        if PICAMERA_AVAILABLE:
-            self.backend = "picamera2"
+        self.backend = camera_backend(backend)
+        if self.backend == "replay":
+            # Zapisane zdjęcia / plik wideo zamiast kamery (testy bez sprzętu)
+            self.cam = ReplaySource.from_env(size=self.size, fps=fps)
+            self._get_frame = self._read_replay
+            self._release_backend = self.cam.release
+        elif self.backend == "picamera2":
+            if not PICAMERA_AVAILABLE:
+                raise RuntimeError("Biblioteka picamera2 jest niedostępna")
             self.cam = Picamera2()
+            # main - klatki do analizy, lores - sprzętowo skalowany podgląd (YUV420)
             self.cam.configure(
-                self.cam.create_preview_configuration(main={"size": (width, height)})
+                self.cam.create_preview_configuration(
+                    main={"size": self.size},
+                    lores={"size": self.preview_size, "format": "YUV420"},
+                )
             )
             self.cam.start()
-            self._get_frame = lambda: cv.cvtColor(
-                self.cam.capture_array(), cv.COLOR_RGB2BGR
-            )
+            self._get_frame = self._read_picamera2
             self._release_backend = self.cam.stop
         else:
-            self.backend = "opencv"
             self.cam = cv.VideoCapture(0)
             self.cam.set(cv.CAP_PROP_FRAME_WIDTH, width)
             self.cam.set(cv.CAP_PROP_FRAME_HEIGHT, height)
             self.cam.set(cv.CAP_PROP_FPS, fps)
             if not self.cam.isOpened():
                 raise RuntimeError("Cannot open camera")
-            self._get_frame = lambda: self.cam.read()[1]
+            self._get_frame = self._read_opencv
             self._release_backend = self.cam.release
 
         # Background reader keeps latest frame ready for MJPEG streaming.
         self.thread = threading.Thread(target=self._reader, daemon=True)
         self.thread.start()
 
+    def _read_picamera2(self, out=None):
+        (main, lores), _metadata = self.cam.capture_arrays(["main", "lores"])
+        return cv.cvtColor(main, cv.COLOR_RGB2BGR, dst=out), lores
+
+    def _read_replay(self, out=None):
+        return self.cam.read(out), None
+
+    def _read_opencv(self, out=None):
+        ok, frame = self.cam.read(out)
+        return (frame if ok else None), None
+
     def get_frame(self):
+        """Kopia następnej klatki z kamery (można po niej rysować)."""
+        ref = self.wait_next()
+        if ref is None:
+            return None
+        with ref:
+            return ref.frame.copy()
+
+    def latest(self):
+        """Najnowsza klatka z bufora (widok bez kopiowania, `FrameRef`)."""
         if self._released:
             raise RuntimeError("Camera has been released")
-        with self.lock:
-            return self._get_frame()
+        return self.frames.latest()
+
+    def since(self, timestamp):
+        """Klatki z bufora wykonane po `timestamp` (`time.monotonic()`)."""
+        if self._released:
+            raise RuntimeError("Camera has been released")
+        return self.frames.since(timestamp)
+
+    def first_after(self, timestamp, timeout=CAMERA_FRAME_TIMEOUT):
+        """Pierwsza klatka wykonana po `timestamp` (`time.monotonic()`)."""
+        if self._released:
+            raise RuntimeError("Camera has been released")
+        return self.frames.first_after(timestamp, timeout=timeout)
+
+    def wait_next(self, after_seq=None, timeout=CAMERA_FRAME_TIMEOUT):
+        """Czekaj na kolejną klatkę (`FrameRef`); None, jeśli nie nadeszła."""
+        if self._released:
+            raise RuntimeError("Camera has been released")
+        return self.frames.wait_next(after_seq=after_seq, timeout=timeout)
 
     def _reader(self):
         while self.running:
+            slot, buffer = self.frames.begin_write()
+            if slot is None:
+                # Wszystkie sloty zajęte przez czytelników - poczekaj chwilę
+                time.sleep(0.001)
+                continue
             with self.lock:
-                frame = self._get_frame()
+                if not self.running:
+                    break
+                frame, preview = self._get_frame(buffer)
             if frame is None:
+                # Brak klatki (błąd odczytu, koniec odtwarzania) - nie kręć pętli na pusto
+                time.sleep(0.01)
                 continue
-            ok, jpg = cv.imencode(".jpg", frame, [int(cv.IMWRITE_JPEG_QUALITY), 70])
-            if not ok:
-                continue
-            # with self.lock:
-            self.frame = jpg.tobytes()
+            seq = self.frames.commit(slot, frame)
+            # JPEG tylko wtedy, gdy ktoś ogląda podgląd
+            if self.broadcaster.has_subscribers:
+                if self._encode_preview(seq, frame, preview):
+                    self.broadcaster.publish(self.frame)
+
+    def _encode_preview(self, seq, frame, preview=None):
+        """Zakoduj podgląd klatki `seq` (najwyżej raz). `preview` to gotowy
+        strumień lores (YUV420) z kamery; bez niego klatka jest skalowana."""
+        with self._jpeg_lock:
+            if seq <= self.frame_seq:
+                return False
+            jpeg = encode_preview(frame, self.preview_size, preview)
+            if jpeg is None:
+                return False
+            self.frame = jpeg
+            self.frame_seq = seq
+            metrics.inc("camera_jpeg_encoded")
+            return True
+
+    def get_jpeg(self):
+        """JPEG podglądu najnowszej klatki. Każda klatka kodowana jest najwyżej
+        raz, wynik jest współdzielony przez wszystkich klientów podglądu."""
+        ref = self.frames.latest()
+        if ref is None:
+            return self.frame
+        with ref:
+            self._encode_preview(ref.seq, ref.frame)
+        return self.frame
 
     def release(self):
         print("Releasing camera...")
@@ -73,25 +207,15 @@ class Camera:
         self.running = False
         if self.thread.is_alive():
             self.thread.join(timeout=1)
+        self.frames.close()
+        self.broadcaster.close()
         with self.lock:
             self._release_backend()
         self._released = True
 
-    async def mjpeg_generator(self):
-        while self.running:
-            await asyncio.sleep(0.03)
-            data = self.frame
-            if not data:
-                continue
-            yield (
-                b"--" + self.boundary + b"\r\n"
-                b"Content-Type: image/jpeg\r\n"
-                b"Content-Length: "
-                + str(len(data)).encode()
-                + b"\r\n\r\n"
-                + data
-                + b"\r\n"
-            )
+    def mjpeg_generator(self):
+        """Strumień multipart dla jednego klienta /camera."""
+        return self.broadcaster.stream()
 
     def stop(self):
         self.release()
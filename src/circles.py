@@ -1,122 +1,312 @@
 import cv2 as cv
 import numpy as np
+from functools import lru_cache
 from math import floor
 
-from .stats import Stats
-from .config import CIRCLE_MIN_RADIUS, CIRCLE_MAX_RADIUS
+from .colors import (
+    COLOR_CLASSES,
+    classify_hsv,
+    color_histogram,
+    histogram_to_distribution,
+)
+from .preprocessing import PreparedFrame
+from .stats import get_stats
+from .config import (
+    COLOR_MODE,
+    CIRCLE_MIN_RADIUS,
+    CIRCLE_MAX_RADIUS,
+    CIRCLE_PYRAMID,
+    CIRCLE_PYRAMID_LEVELS,
+    CIRCLE_PYRAMID_PARAM2,
+    CIRCLE_REFINE_MARGIN,
+)
 
 
 def detect_circles(
-    frame, FRAME_LEFT_MARGIN, FRAME_TOP_MARGIN, FRAME_WIDTH, FRAME_HEIGHT, params={}
+    frame,
+    FRAME_LEFT_MARGIN,
+    FRAME_TOP_MARGIN,
+    FRAME_WIDTH,
+    FRAME_HEIGHT,
+    params={},
+    prepared=None,
 ):
-    results_circles = []
-    gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-    gray = cv.medianBlur(gray, 5)
+    if prepared is None:
+        prepared = PreparedFrame.with_roi(
+            frame, FRAME_LEFT_MARGIN, FRAME_TOP_MARGIN, FRAME_WIDTH, FRAME_HEIGHT
+        )
+    positions = find_circles(
+        frame,
+        FRAME_LEFT_MARGIN,
+        FRAME_TOP_MARGIN,
+        FRAME_WIDTH,
+        FRAME_HEIGHT,
+        params=params,
+        prepared=prepared,
+    )
+    return classify_circles(positions, prepared, params=params)
+
+
+def find_circles(
+    frame,
+    FRAME_LEFT_MARGIN,
+    FRAME_TOP_MARGIN,
+    FRAME_WIDTH,
+    FRAME_HEIGHT,
+    params={},
+    prepared=None,
+):
+    """Położenia kół (x, y, r) we współrzędnych klatki, bez klasyfikacji koloru."""
+    if prepared is None:
+        prepared = PreparedFrame.with_roi(
+            frame, FRAME_LEFT_MARGIN, FRAME_TOP_MARGIN, FRAME_WIDTH, FRAME_HEIGHT
+        )
     param1 = params.get("param1", 15)
     param2 = params.get("param2", 35)
-    detected_circles = cv.HoughCircles(
-        gray,
+    if params.get("pyramid", CIRCLE_PYRAMID):
+        detected_circles = _hough_pyramid(prepared.gray, param1, param2, params)
+    else:
+        detected_circles = cv.HoughCircles(
+            prepared.blurred,
+            cv.HOUGH_GRADIENT,
+            dp=1,  # odwrotność skali akumulatora względem obrazu. 1 = ta sama rozdzielczość; >1 zmniejsza rozdzielczość akumulatora (szybciej, ale mniej dokładnie).
+            minDist=(
+                CIRCLE_MIN_RADIUS * 2
+            ),  # minimalna odległość między środkami wykrytych okręgów (w pikselach). Za małe → duplikaty; za duże → pomijanie bliskich okręgów.
+            param1=param1,
+            # param1 – górny próg dla Canny:
+            # HoughCircles wewnętrznie uruchamia Canny(low=param1/2, high=param1).
+            # Wyższy param1 → mniej krawędzi (bardziej „pewne” krawędzie), mniejszy szum, ale ryzyko utraty słabych okręgów.
+            # Niższy param1 → więcej krawędzi (także szumu), koła łatwiej „zbierają” głosy, ale rośnie liczba fałszywych detekcji.
+            # Typowe zakresy: 100–250.
+            param2=param2,
+            # param2 – próg akumulatora dla środków okręgów:
+            # Minimalna liczba „głosów” z krawędzi, aby uznać punkt za środek koła.
+            # Wyższy param2 → mniej detekcji, ale bardziej pewne; zbyt wysoki gubi słabsze/małe koła.
+            # Niższy param2 → więcej detekcji, także fałszywych/duplikatów (zwłaszcza przy niskim param1).
+            # Czułość param2 zależy od dp i zakresu promieni: dla mniejszych kół zwykle trzeba go obniżyć.
+            # Typowe zakresy: 20–80.
+            #  Jak je stroić w praktyce:
+            # Najpierw ustaw minRadius/maxRadius możliwie wąsko dla Twoich obiektów.
+            # Dobierz param1 patrząc na krawędzie Canny – krawędź koła powinna być ciągła, tło możliwie czyste.
+            # Podgląd krawędzi:
+            #         gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+            # gray = cv.medianBlur(gray, 5)
+            # edges = cv.Canny(gray, param1 // 2, param1)
+            # cv.imshow("edges", edges)
+            # Potem reguluj param2:
+            # Brak/mało kół → obniż param2 (np. 45 → 35) lub nieco obniż param1 (200 → 150).
+            # Za dużo fałszywych/duplikatów → podnieś param2 (np. 45 → 60) lub podnieś param1 (200 → 230).
+            # Pamiętaj: gdy zwiększysz dp (>1), akumulator ma mniejszą rozdzielczość i często trzeba nieco obniżyć param2.
+            # Dla Twoich bieżących wartości (param1=200, param2=45):
+            minRadius=CIRCLE_MIN_RADIUS,
+            maxRadius=CIRCLE_MAX_RADIUS,
+        )
+    if detected_circles is None:
+        return []
+    detected_circles = np.uint16(np.around(detected_circles))
+    # Hough działał na oknie detekcji - przeliczenie na współrzędne klatki
+    detected_circles[0, :, :2] += np.array(prepared.offset, dtype=np.uint16)
+    return filter_circles(
+        detected_circles[0],
+        FRAME_LEFT_MARGIN,
+        FRAME_TOP_MARGIN,
+        FRAME_WIDTH,
+        FRAME_HEIGHT,
+    )
+
+
+def classify_circles(circles, prepared, params={}):
+    """Kolor każdego koła (x, y, r) - wynik w formacie `detect_circles`."""
+    results_circles = []
+    if not circles:
+        return results_circles
+    hsv_frame = prepared.hsv
+    offset_x, offset_y = prepared.offset
+    color_mode = params.get("color_mode", COLOR_MODE)
+    for a, b, r in circles:
+        color, average, colors = get_circle_color_distribution(
+            a - offset_x,
+            b - offset_y,
+            r,
+            prepared.window_view,
+            hsv_frame,
+            mode=color_mode,
+        )
+        circle = {"x": a, "y": b, "r": r, "color": color, "hsv": average.tolist()}
+        if colors is not None:
+            circle["colors"] = colors
+        results_circles.append(circle)
+    return results_circles
+
+
+def _hough_pyramid(gray, param1, param2, params={}):
+    """Dwuetapowe HoughCircles: kandydaci na pomniejszonym obrazie, dokładne
+    położenie i promień w małym oknie w pełnej rozdzielczości.
+
+    `gray` to obraz bez rozmycia - medianBlur liczony jest tylko na małym
+    obrazie i w oknach kandydatów, a nie na całej klatce.
+
+    Etap 1: `levels` razy pyrDown, zakres promieni i minDist przeskalowane,
+    niższy próg akumulatora (`coarse_param2`) - obwód koła ma mniej pikseli.
+    Etap 2: dla każdego kandydata HoughCircles w oknie o boku ~2*(r + margin)
+    z promieniem ograniczonym do r +/- margin i pełnym `param2`; kandydat bez
+    potwierdzenia odpada. Zwraca wynik w formacie `cv.HoughCircles`.
+    """
+    levels = params.get("pyramid_levels", CIRCLE_PYRAMID_LEVELS)
+    coarse_param2 = params.get("coarse_param2", CIRCLE_PYRAMID_PARAM2)
+    margin = params.get("refine_margin", CIRCLE_REFINE_MARGIN)
+    scale = 2**levels
+    min_dist = CIRCLE_MIN_RADIUS * 2
+
+    small = gray
+    for _ in range(levels):
+        small = cv.pyrDown(small)
+    coarse = cv.HoughCircles(
+        cv.medianBlur(small, 3),
         cv.HOUGH_GRADIENT,
-        dp=1,  # odwrotność skali akumulatora względem obrazu. 1 = ta sama rozdzielczość; >1 zmniejsza rozdzielczość akumulatora (szybciej, ale mniej dokładnie).
-        minDist=(
-            CIRCLE_MIN_RADIUS * 2
-        ),  # minimalna odległość między środkami wykrytych okręgów (w pikselach). Za małe → duplikaty; za duże → pomijanie bliskich okręgów.
+        dp=1,
+        minDist=max(min_dist / scale, 1),
         param1=param1,
-        # param1 – górny próg dla Canny:
-        # HoughCircles wewnętrznie uruchamia Canny(low=param1/2, high=param1).
-        # Wyższy param1 → mniej krawędzi (bardziej „pewne” krawędzie), mniejszy szum, ale ryzyko utraty słabych okręgów.
-        # Niższy param1 → więcej krawędzi (także szumu), koła łatwiej „zbierają” głosy, ale rośnie liczba fałszywych detekcji.
-        # Typowe zakresy: 100–250.
-        param2=param2,
-        # param2 – próg akumulatora dla środków okręgów:
-        # Minimalna liczba „głosów” z krawędzi, aby uznać punkt za środek koła.
-        # Wyższy param2 → mniej detekcji, ale bardziej pewne; zbyt wysoki gubi słabsze/małe koła.
-        # Niższy param2 → więcej detekcji, także fałszywych/duplikatów (zwłaszcza przy niskim param1).
-        # Czułość param2 zależy od dp i zakresu promieni: dla mniejszych kół zwykle trzeba go obniżyć.
-        # Typowe zakresy: 20–80.
-        #  Jak je stroić w praktyce:
-        # Najpierw ustaw minRadius/maxRadius możliwie wąsko dla Twoich obiektów.
-        # Dobierz param1 patrząc na krawędzie Canny – krawędź koła powinna być ciągła, tło możliwie czyste.
-        # Podgląd krawędzi:
-        #         gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-        # gray = cv.medianBlur(gray, 5)
-        # edges = cv.Canny(gray, param1 // 2, param1)
-        # cv.imshow("edges", edges)
-        # Potem reguluj param2:
-        # Brak/mało kół → obniż param2 (np. 45 → 35) lub nieco obniż param1 (200 → 150).
-        # Za dużo fałszywych/duplikatów → podnieś param2 (np. 45 → 60) lub podnieś param1 (200 → 230).
-        # Pamiętaj: gdy zwiększysz dp (>1), akumulator ma mniejszą rozdzielczość i często trzeba nieco obniżyć param2.
-        # Dla Twoich bieżących wartości (param1=200, param2=45):
-        minRadius=CIRCLE_MIN_RADIUS,
-        maxRadius=CIRCLE_MAX_RADIUS,
+        param2=coarse_param2,
+        minRadius=max(CIRCLE_MIN_RADIUS // scale - 1, 1),
+        maxRadius=-(-CIRCLE_MAX_RADIUS // scale) + 1,
     )
-    filtered = []
-    if detected_circles is not None:
-        detected_circles = np.uint16(np.around(detected_circles))
-        circles = [tuple(map(int, pt)) for pt in detected_circles[0, :]]
-        circles.sort(key=lambda x: -x[2])
-        for i, (a1, b1, r1) in enumerate(circles):
-            inside = False
-            for a2, b2, r2 in filtered:
-                if (a1 - a2) ** 2 + (b1 - b2) ** 2 < r2**2:
-                    inside = True
-                    break
-            if not inside and (
-                FRAME_LEFT_MARGIN <= a1 < FRAME_LEFT_MARGIN + FRAME_WIDTH
-                and FRAME_TOP_MARGIN <= b1 < FRAME_TOP_MARGIN + FRAME_HEIGHT
-            ):
-                filtered.append((a1, b1, r1))
-        detected_circles = np.array([filtered], dtype=np.uint16)
-
-    if detected_circles is not None:
-        for pt in detected_circles[0, :]:
-            a, b, r = int(pt[0]), int(pt[1]), int(pt[2])
-            color, average = get_circle_color_info(a, b, r, frame)
-            results_circles.append(
-                {"x": a, "y": b, "r": r, "color": color, "hsv": average.tolist()}
-            )
+    if coarse is None:
+        return None
 
-    return results_circles
+    height, width = gray.shape[:2]
+    refined = []
+    for x, y, r in coarse[0] * scale:
+        r_min = max(CIRCLE_MIN_RADIUS, int(r) - margin)
+        r_max = min(CIRCLE_MAX_RADIUS, int(r) + margin)
+        if r_min > r_max:
+            continue
+        # +2 px na brzeg medianBlur(5) - wewnątrz okna jak przy rozmyciu całej klatki
+        half = r_max + margin + 2
+        x0, y0 = max(int(x) - half, 0), max(int(y) - half, 0)
+        x1, y1 = min(int(x) + half, width), min(int(y) + half, height)
+        found = cv.HoughCircles(
+            cv.medianBlur(gray[y0:y1, x0:x1], 5),
+            cv.HOUGH_GRADIENT,
+            dp=1,
+            minDist=min_dist,
+            param1=param1,
+            param2=param2,
+            minRadius=r_min,
+            maxRadius=r_max,
+        )
+        if found is None:
+            continue
+        # Najsilniejszy okrąg w oknie, we współrzędnych całego obrazu
+        cx, cy, cr = found[0, 0]
+        cx, cy = cx + x0, cy + y0
+        # Dwóch kandydatów może wskazać to samo koło - minDist jak w trybie jednoetapowym
+        if all((cx - a) ** 2 + (cy - b) ** 2 >= min_dist**2 for a, b, _ in refined):
+            refined.append((cx, cy, cr))
+    if not refined:
+        return None
+    return np.array([refined], dtype=np.float32)
 
 
-def get_circle_color_info(a, b, r, frame):
-    hsv_frame = cv.cvtColor(frame, cv.COLOR_BGR2HSV)
+def filter_circles(circles, left, top, width, height):
+    """Usuwa koła zagnieżdżone i te ze środkiem poza ramką.
+
+    Od największego promienia: koło odpada, jeśli jego środek leży wewnątrz
+    wcześniej przyjętego koła. Koła spoza ramki nigdy nie są przyjmowane,
+    więc nikogo nie eliminują - odrzucamy je od razu. Pętla przechodzi tylko
+    po kołach przyjętych (zwykle kilka), a każde z nich eliminuje naraz
+    wszystkie dalsze koła, których środki zawiera.
+    """
+    circles = np.asarray(circles, dtype=np.int64).reshape(-1, 3)
+    # Stabilne sortowanie - przy równych promieniach zostaje kolejność z Hougha
+    circles = circles[np.argsort(-circles[:, 2], kind="stable")]
+    a, b, r = circles[:, 0], circles[:, 1], circles[:, 2]
+    in_frame = (left <= a) & (a < left + width) & (top <= b) & (b < top + height)
+    circles = circles[in_frame]
+    a, b, r = circles[:, 0], circles[:, 1], circles[:, 2]
+
+    alive = np.ones(len(circles), dtype=bool)
+    kept = []
+    i = 0
+    while i < len(circles):
+        kept.append(i)
+        rest = slice(i + 1, None)
+        alive[rest] &= (a[rest] - a[i]) ** 2 + (b[rest] - b[i]) ** 2 >= r[i] ** 2
+        following = np.flatnonzero(alive[rest])
+        if not len(following):
+            break
+        i += 1 + following[0]
+    return [tuple(map(int, circle)) for circle in circles[kept]]
+
+
+@lru_cache(maxsize=32)
+def _disk_stencil(r):
+    """Maska koła o promieniu r na kwadracie 2r x 2r (środek w punkcie (r, r)).
+
+    Zakres [-r, r) w obu osiach odpowiada dotychczasowej pętli po pikselach.
+    """
+    offsets = np.arange(-r, r)
+    stencil = offsets[np.newaxis, :] ** 2 + offsets[:, np.newaxis] ** 2 <= r**2
+    stencil = stencil.astype(np.uint8)
+    stencil.setflags(write=False)
+    return stencil
+
+
+def get_circle_color_info(a, b, r, frame, hsv_frame=None, mode=COLOR_MODE):
+    """Kolor koła o środku (a, b) i promieniu r: (kolor, średnie HSV
+    z dominantą odcienia). Tryby opisuje `get_circle_color_distribution`."""
+    color, average, _distribution = get_circle_color_distribution(
+        a, b, r, frame, hsv_frame, mode=mode
+    )
+    return color, average
+
+
+def get_circle_color_distribution(a, b, r, frame, hsv_frame=None, mode=COLOR_MODE):
+    """Jak `get_circle_color_info`, z rozkładem klas kolorów w kole.
+
+    Tryb "mode": dominanta odcienia i średnie S/V koła, jedna klasyfikacja
+    `classify_hsv`. Tryb "pixels": każdy piksel koła klasyfikowany tablicą LUT,
+    kolorem jest najliczniejsza klasa. Zwraca (kolor, średnie HSV z dominantą
+    odcienia, rozkład klas {kolor: udział} - tylko w trybie "pixels", inaczej None).
+    """
+    if hsv_frame is None:
+        hsv_frame = cv.cvtColor(frame, cv.COLOR_BGR2HSV)
+    r = floor(r)
+    frame_h, frame_w = hsv_frame.shape[:2]
+    # Przycięcie kwadratu opisanego na kole do granic klatki
+    y0, y1 = max(b - r, 0), min(b + r, frame_h)
+    x0, x1 = max(a - r, 0), min(a + r, frame_w)
+
     average = np.array([0.0, 0.0, 0.0])
-    count = 0
-    hue_list = []
-    for y in range(b - floor(r), b + floor(r)):
-        for x in range(a - floor(r), a + floor(r)):
-            if 0 <= y < hsv_frame.shape[0] and 0 <= x < hsv_frame.shape[1]:
-                if (x - a) ** 2 + (y - b) ** 2 <= r**2:
-                    average += hsv_frame[y, x, :]
-                    count += 1
-                    hue_list.append(hsv_frame[y, x, 0])
-    if count > 0:
-        average /= count
-    if hue_list:
-        hue_value = int(np.bincount(np.array(hue_list, dtype=np.uint8)).argmax())
-    else:
-        hue_value = 0
+    hue_value = 0
+    histogram = None
+    if y0 < y1 and x0 < x1:
+        stencil = _disk_stencil(r)
+        mask = stencil[y0 - (b - r) : y1 - (b - r), x0 - (a - r) : x1 - (a - r)]
+        patch = hsv_frame[y0:y1, x0:x1]
+        count = cv.countNonZero(mask)
+        if count > 0:
+            # cv.mean mnoży przez odwrotność liczby pikseli; odtwarzamy dokładne
+            # (całkowite) sumy, żeby średnia była identyczna jak sumowanie po pikselach
+            sums = np.round(np.array(cv.mean(patch, mask=mask)[:3]) * count)
+            average = sums / count
+            hist = cv.calcHist([patch], [0], mask, [180], [0, 180])
+            hue_value = int(hist.argmax())
+            if mode == "pixels":
+                histogram = color_histogram(patch, mask)
     average[0] = hue_value
-    if average[2] < 80 or (average[2] < 150 and average[1] < 100):
-        color = "czarny"
-    elif hue_value < 7.5:
-        color = "czerwony"
-    elif hue_value < 19:
-        color = "pomaranczowy"
-    elif hue_value < 35:
-        color = "zolty"
-    elif hue_value < 80:
-        color = "zielony"
-    elif hue_value < 122.5:
-        color = "niebieski"
-    elif hue_value < 140:
-        color = "fioletowy"
-    elif hue_value < 162.5:
-        color = "rozowy"
+
+    distribution = None
+    if mode == "pixels":
+        if histogram is not None:
+            color = COLOR_CLASSES[int(histogram.argmax())]
+            distribution = histogram_to_distribution(histogram)
+        else:
+            color = classify_hsv(0, 0, 0)
+            distribution = {}
     else:
-        color = "czerwony"
+        color = classify_hsv(hue_value, average[1], average[2])
 
-    stats = Stats()
-    stats.inc(f"wizja_color_{color}")
-    return color, average
+    get_stats().inc(f"wizja_color_{color}")
+    return color, average, distribution
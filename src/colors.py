@@ -0,0 +1,107 @@
+import hashlib
+import logging
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from .config import (
+    COLOR_BLACK_V,
+    COLOR_DARK_V,
+    COLOR_DARK_S,
+    COLOR_HUE_THRESHOLDS,
+    COLOR_LUT_CACHE,
+)
+
+logger = logging.getLogger("system_wizyjny")
+
+BLACK = "czarny"
+# Klasy kolorów w kolejności indeksów tablicy LUT
+COLOR_CLASSES = tuple(dict.fromkeys([BLACK] + [n for _, n in COLOR_HUE_THRESHOLDS]))
+
+
+def classify_hsv(hue, saturation, value):
+    """Kolor dla jednej trójki HSV - progi z config (sekcja KOLORY KÓŁEK)."""
+    if value < COLOR_BLACK_V or (value < COLOR_DARK_V and saturation < COLOR_DARK_S):
+        return BLACK
+    for upper, name in COLOR_HUE_THRESHOLDS:
+        if hue < upper:
+            return name
+    return COLOR_HUE_THRESHOLDS[-1][1]
+
+
+def build_color_lut():
+    """Tablica (180, 256, 256) uint8 (ok. 11.8 MB): indeks klasy z COLOR_CLASSES
+    dla każdej trójki (H, S, V) - te same progi co `classify_hsv`."""
+    hue = np.arange(180)
+    hue_class = np.full(180, COLOR_CLASSES.index(COLOR_HUE_THRESHOLDS[-1][1]))
+    for upper, name in reversed(COLOR_HUE_THRESHOLDS):
+        hue_class[hue < upper] = COLOR_CLASSES.index(name)
+    s = np.arange(256)[:, np.newaxis]
+    v = np.arange(256)[np.newaxis, :]
+    dark = (v < COLOR_BLACK_V) | ((v < COLOR_DARK_V) & (s < COLOR_DARK_S))
+    lut = np.where(
+        dark[np.newaxis], COLOR_CLASSES.index(BLACK), hue_class[:, None, None]
+    )
+    return lut.astype(np.uint8)
+
+
+def _lut_key():
+    thresholds = (COLOR_BLACK_V, COLOR_DARK_V, COLOR_DARK_S, COLOR_HUE_THRESHOLDS)
+    return hashlib.sha1(repr((COLOR_CLASSES, thresholds)).encode()).hexdigest()
+
+
+@lru_cache(maxsize=1)
+def get_color_lut():
+    """LUT z pliku COLOR_LUT_CACHE albo zbudowana od nowa (i zapisana), gdy
+    pliku brak lub progi w config się zmieniły. Zwraca spłaszczoną tablicę."""
+    path = os.path.join(os.path.dirname(os.path.dirname(__file__)), COLOR_LUT_CACHE)
+    key = _lut_key()
+    try:
+        with np.load(path) as cached:
+            if str(cached["key"]) == key:
+                lut = cached["lut"]
+                lut.setflags(write=False)
+                return lut.ravel()
+    except Exception:
+        pass
+
+    lut = build_color_lut()
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, lut=lut, key=key)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Nie udało się zapisać tablicy kolorów: {e}")
+    lut.setflags(write=False)
+    return lut.ravel()
+
+
+def color_histogram(hsv_pixels, mask=None):
+    """Liczba pikseli HSV (uint8, H < 180) w każdej z klas COLOR_CLASSES.
+
+    Jedno `np.take` z tablicy LUT i `np.bincount` - bez pętli po pikselach.
+    """
+    if mask is None:
+        mask = np.ones(hsv_pixels.shape[:2], dtype=bool)
+    mask = mask.astype(bool, copy=False)
+    # Indeks płaskiej tablicy (H << 16) | (S << 8) | V, osobno dla kanałów -
+    # bez kopiowania całych pikseli maskowaniem po trójkach
+    index = hsv_pixels[..., 0][mask].astype(np.int32) << 16
+    index |= hsv_pixels[..., 1][mask].astype(np.int32) << 8
+    index |= hsv_pixels[..., 2][mask]
+    classes = np.take(get_color_lut(), index)
+    return np.bincount(classes, minlength=len(COLOR_CLASSES))
+
+
+def histogram_to_distribution(histogram):
+    """Udziały klas {kolor: ułamek pikseli}, tylko klasy obecne."""
+    total = int(histogram.sum())
+    if not total:
+        return {}
+    return {
+        name: round(int(count) / total, 3)
+        for name, count in zip(COLOR_CLASSES, histogram)
+        if count
+    }
@@ -3,13 +3,152 @@ FRAME_LEFT_MARGIN = 30  # Lewy margines ramki (x)
 FRAME_TOP_MARGIN = 0  # Górny margines ramki (y)
 FRAME_RIGHT_MARGIN = 40  # Prawy margines ramki
 FRAME_BOTTOM_MARGIN = 0  # Dolny margines ramki
+# Węższy obszar inspekcji (x, y, szerokość, wysokość), np. dobrany pod produkt;
+# None = ramka wyznaczona marginesami
+INSPECTION_ROI = None
+# --- KONIEC KONFIGURACJI ---
+
+# --- KONFIGURACJA WYKRYWANIA KONTURÓW ---
+# "edges" - Canny + findContours; "blobs" - progowanie + connectedComponentsWithStats
+CONTOUR_MODE = "edges"
+CONTOUR_BLOB_THRESHOLD = None  # Próg jasności w trybie "blobs" (None = Otsu)
+CONTOUR_BLOB_INVERT = True  # Obiekty ciemniejsze od tła (THRESH_BINARY_INV)
+CONTOUR_BLOB_MIN_AREA = 50  # Mniejsze składowe (px) traktowane jako szum
 # --- KONIEC KONFIGURACJI ---
 
 # --- KONFIGURACJA WYKRYWANIA KÓŁEK ---
 CIRCLE_MIN_RADIUS = 60  # Minimalny promień wykrywanego kółka
 CIRCLE_MAX_RADIUS = 75  # Maksymalny promień wykrywanego kółka
+# Detekcja działa na ramce poszerzonej o tyle pikseli (koła przy krawędzi ramki
+# mieszczą się w całości, zapas na brzegi filtrów medianBlur/Sobel)
+DETECTION_PADDING = CIRCLE_MAX_RADIUS + 5
+# Tryb dwuetapowy (piramida): kandydaci na obrazie pomniejszonym
+# CIRCLE_PYRAMID_LEVELS razy przez pyrDown (z progiem CIRCLE_PYRAMID_PARAM2),
+# potem doprecyzowanie w oknie pełnej rozdzielczości, promień +/- CIRCLE_REFINE_MARGIN
+CIRCLE_PYRAMID = False
+CIRCLE_PYRAMID_LEVELS = 1
+CIRCLE_PYRAMID_PARAM2 = 20
+CIRCLE_REFINE_MARGIN = 6
 # --- KONIEC KONFIGURACJI ---
 
+# --- KOLORY KÓŁEK ---
+# Progi klasyfikacji HSV (H 0-179, S/V 0-255). Czarny: V < COLOR_BLACK_V albo
+# (V < COLOR_DARK_V i S < COLOR_DARK_S); pozostałe wg pierwszego progu H większego od odcienia
+COLOR_BLACK_V = 80
+COLOR_DARK_V = 150
+COLOR_DARK_S = 100
+COLOR_HUE_THRESHOLDS = (
+    (7.5, "czerwony"),
+    (19, "pomaranczowy"),
+    (35, "zolty"),
+    (80, "zielony"),
+    (122.5, "niebieski"),
+    (140, "fioletowy"),
+    (162.5, "rozowy"),
+    (180, "czerwony"),
+)
+# "mode" - dominanta odcienia i średnie S/V koła; "pixels" - każdy piksel koła
+# klasyfikowany tablicą LUT, wygrywa najliczniejsza klasa (odporne na odblaski).
+# Tablica LUT (180x256x256 uint8) zajmuje ok. 11.8 MB RAM - ładowana tylko w "pixels"
+COLOR_MODE = "mode"
+COLOR_LUT_CACHE = "color_lut.npz"  # Plik z zapisaną tablicą LUT (obok stats.json)
+# --- KONIEC KOLORY KÓŁEK ---
+
 # --- LIMITY ---
 STILL_REPETITION_LIMIT = 1  # Limit prób wykrywania obiektów w trybie still
+# Ile sekund po odczytaniu żądania analizy z PLC musi być wykonana analizowana klatka
+# (czas na zatrzymanie się elementu - chroni przed rozmytymi klatkami)
+ANALYSIS_SETTLE_DELAY = 0.0
+# Głosowanie: analizuj do STILL_VOTING_FRAMES kolejnych klatek i zakończ, gdy
+# STILL_VOTING_AGREE z nich zgadza się co do liczby i kolorów kół (1 = wyłączone)
+STILL_VOTING_FRAMES = 1
+STILL_VOTING_AGREE = 2
 # --- KONIEC LIMITY ---
+
+# --- STATYSTYKI ---
+STATS_FLUSH_INTERVAL = 5.0  # Co ile sekund zapisywać liczniki do stats.json
+# --- KONIEC STATYSTYKI ---
+
+# --- METRYKI ---
+METRICS_WINDOW = 1000  # Liczba ostatnich próbek do wyliczania percentyli
+EVENT_LOOP_LAG_INTERVAL = 0.1  # Co ile sekund mierzyć opóźnienie pętli zdarzeń
+# --- KONIEC METRYKI ---
+
+# --- ZAPIS ZDJĘĆ ---
+IMAGE_QUEUE_SIZE = 8  # Maksymalna liczba zdjęć czekających na zapis
+IMAGE_QUEUE_DROP_POLICY = "drop_oldest"  # "drop_oldest", "drop_newest" lub "block"
+# --- KONIEC ZAPIS ZDJĘĆ ---
+
+# --- KAMERA ---
+# Rozdzielczość klatek do analizy (szer., wys.). Promienie kółek wyżej dobrane są pod 640x360.
+CAMERA_ANALYSIS_SIZE = (640, 360)
+CAMERA_PREVIEW_SIZE = (320, 180)  # Rozdzielczość podglądu MJPEG w panelu
+CAMERA_FPS = 30
+CAMERA_RING_SIZE = 8  # Liczba klatek w buforze pierścieniowym kamery
+CAMERA_FRAME_TIMEOUT = 2.0  # Maksymalny czas oczekiwania na klatkę (s)
+CAMERA_JPEG_QUALITY = 70  # Jakość JPEG podglądu MJPEG
+# --- KONIEC KAMERA ---
+
+# --- ODPYTYWANIE PLC ---
+PLC_POLL_FAST = 0.015  # Okres odpytywania, gdy linia pracuje (s)
+PLC_POLL_IDLE = 0.2  # Maksymalny okres odpytywania, gdy linia stoi (s)
+PLC_POLL_IDLE_AFTER = 2.0  # Po ilu sekundach bez aktywności zwalniać odpytywanie
+PLC_POLL_BACKOFF = 2.0  # Mnożnik okresu przy zwalnianiu
+PLC_WRITE_BATCH_WINDOW = 0.02  # Okno (s) łączenia zapisów z panelu w jeden zapis do PLC
+PLC_WRITE_MERGE_GAP = 2  # Zakresy bajtów oddalone o tyle bajtów zapisujemy razem
+# --- KONIEC ODPYTYWANIE PLC ---
+
+# --- ANALIZA WSTĘPNA ---
+PREANALYSIS_ENABLED = False  # Analizuj klatki już wtedy, gdy element leży w podajniku
+PREANALYSIS_STABLE_FRAMES = 3  # Ile kolejnych klatek musi dać ten sam wynik
+PREANALYSIS_MAX_AGE = 0.3  # Maksymalny wiek (s) werdyktu względem wyzwolenia analizy
+# --- KONIEC ANALIZA WSTĘPNA ---
+
+# --- ŚLEDZENIE KÓŁ (tryb live) ---
+TRACK_FULL_SEARCH_EVERY = 10  # Co ile klatek przeszukiwać całą ramkę
+TRACK_WINDOW_MARGIN = 30  # Promień (px) okna wokół przewidzianego środka koła
+TRACK_MAX_MISSES = 3  # Po ilu klatkach bez pomiaru usuwać ślad
+TRACK_CONFIRM_HITS = 3  # Po ilu trafieniach ślad liczy się jako nowy element
+TRACK_SMOOTHING = 0.5  # Wygładzanie prędkości (0..1, 1 = tylko ostatni pomiar)
+# --- KONIEC ŚLEDZENIE KÓŁ ---
+
+# --- BRAMKOWANIE KLATEK (tryby ciągłe) ---
+GATE_ENABLED = True  # Pomijaj detekcję na klatkach bez zmian i z pustym pasem
+GATE_SCALE = 8  # Sygnatura klatki: ramka pomniejszona tyle razy, w skali szarości
+GATE_PIXEL_THRESHOLD = 12  # Różnica jasności piksela sygnatury uznawana za zmianę
+GATE_CHANGED_FRACTION = 0.01  # Odsetek zmienionych pikseli oznaczający zmianę klatki
+GATE_BACKGROUND_RATE = 0.05  # Tempo uczenia modelu tła (pusty pas)
+GATE_MAX_SKIP = (
+    30  # Po tylu pominiętych klatkach z rzędu detekcja i tak jest wykonywana
+)
+# --- KONIEC BRAMKOWANIE KLATEK ---
+
+# --- POTOK ANALIZY KLATKI ---
+# Dozwolone etapy (src/pipeline.py), w kolejności: capture, preprocess, circles,
+# color, contours, annotate, persist. Etap wykonuje się, gdy jest na tej liście
+# i wynika z wywołania (np. contours tylko z flagą -k). Czas, wielkość wejścia
+# i przyrost alokacji każdego etapu trafiają do wyniku (result["pipeline"]).
+# Lista ogranicza tylko etapy opcjonalne (contours, annotate, persist) - capture,
+# preprocess, circles i color wykonują się zawsze, gdy wynikają z wywołania.
+PIPELINE_STAGES = (
+    "capture",
+    "preprocess",
+    "circles",
+    "color",
+    "contours",
+    "annotate",
+    "persist",
+)
+# --- KONIEC POTOK ANALIZY KLATKI ---
+
+# --- PROCES WIZYJNY ---
+# Kamera i analiza w osobnym procesie (src/vision_process.py) - proces API obsługuje
+# tylko HTTP/WebSocket i PLC. Klatki podglądu przez pamięć współdzieloną, wyniki kolejką.
+VISION_PROCESS = False
+VISION_PROCESS_SLOTS = 3  # Sloty klatek w pamięci współdzielonej (min. 3)
+VISION_PROCESS_PREVIEW_HOLD = (
+    1.0  # Tyle sekund po prośbie podglądu proces wysyła klatki
+)
+VISION_PROCESS_START_TIMEOUT = 30.0  # Maksymalny czas startu procesu (import, kamera)
+VISION_PROCESS_ANALYZE_TIMEOUT = 10.0  # Maksymalny czas czekania na wynik (s)
+# --- KONIEC PROCES WIZYJNY ---
@@ -1,41 +1,150 @@
 import cv2 as cv
+import numpy as np
+
+from .config import (
+    CONTOUR_MODE,
+    CONTOUR_BLOB_THRESHOLD,
+    CONTOUR_BLOB_INVERT,
+    CONTOUR_BLOB_MIN_AREA,
+)
+from .preprocessing import PreparedFrame
+
+# Stałe z cv::moments (contourMoments) - te same mnożniki dają te same bity
+_DB1_2 = 0.5
+_DB1_6 = 0.16666666666666666666666666666667
+
+
+def contour_centroids(kontury):
+    """Środki ciężkości (cx, cy) wszystkich konturów naraz.
+
+    Odpowiednik `int(M["m10"] / M["m00"])` z `cv.moments` liczony wzorem
+    Greena na wszystkich wierzchołkach jednocześnie. Sumy dla całkowitych
+    współrzędnych są dokładne, a skalowanie powtarza kolejność działań
+    OpenCV, więc wynik jest identyczny. Zwraca (cx, cy, valid), gdzie
+    `valid` oznacza m00 != 0.
+    """
+    if not kontury:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=bool)
+    lengths = np.fromiter((len(k) for k in kontury), dtype=np.int64, count=len(kontury))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    points = np.concatenate(kontury).reshape(-1, 2).astype(np.int64)
+    x, y = points[:, 0], points[:, 1]
+    # Poprzedni wierzchołek w obrębie tego samego konturu (dla pierwszego - ostatni)
+    previous = np.arange(len(points)) - 1
+    previous[starts] = starts + lengths - 1
+    xp, yp = x[previous], y[previous]
+
+    dxy = xp * y - x * yp
+    a00 = np.add.reduceat(dxy, starts)
+    a10 = np.add.reduceat(dxy * (xp + x), starts)
+    a01 = np.add.reduceat(dxy * (yp + y), starts)
+
+    valid = a00 != 0
+    sign = np.where(a00 > 0, 1.0, -1.0)
+    m00 = a00 * (sign * _DB1_2)
+    m10 = a10 * (sign * _DB1_6)
+    m01 = a01 * (sign * _DB1_6)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cx = np.trunc(np.where(valid, m10 / m00, 0)).astype(np.int64)
+        cy = np.trunc(np.where(valid, m01 / m00, 0)).astype(np.int64)
+    return cx, cy, valid
 
 
 def detect_contours(
-    frame, FRAME_LEFT_MARGIN, FRAME_TOP_MARGIN, FRAME_WIDTH, FRAME_HEIGHT
+    frame,
+    FRAME_LEFT_MARGIN,
+    FRAME_TOP_MARGIN,
+    FRAME_WIDTH,
+    FRAME_HEIGHT,
+    prepared=None,
+    mode=CONTOUR_MODE,
 ):
     obiektow = 0
-    gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-    gray = cv.medianBlur(gray, 5)
+    if prepared is None:
+        prepared = PreparedFrame.with_roi(
+            frame, FRAME_LEFT_MARGIN, FRAME_TOP_MARGIN, FRAME_WIDTH, FRAME_HEIGHT
+        )
+    if mode == "blobs":
+        return detect_blobs(prepared)
+    gray = prepared.blurred
     krawedzie = cv.Canny(gray, 50, 140)
-    kontury, _ = cv.findContours(krawedzie, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+    # Kontury z okna detekcji od razu we współrzędnych klatki
+    kontury, _ = cv.findContours(
+        krawedzie, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE, offset=prepared.offset
+    )
     # Filtracja konturów: tylko te, których środek jest w ramce
-    kontury_filtered = []
-    for kontur in kontury:
-        M = cv.moments(kontur)
-        if M["m00"] != 0:
-            cx = int(M["m10"] / M["m00"])
-            cy = int(M["m01"] / M["m00"])
-            if (
-                FRAME_LEFT_MARGIN <= cx < FRAME_LEFT_MARGIN + FRAME_WIDTH
-                and FRAME_TOP_MARGIN <= cy < FRAME_TOP_MARGIN + FRAME_HEIGHT
-            ):
-                kontury_filtered.append(kontur)
-    kontury = kontury_filtered
+    cx, cy, valid = contour_centroids(kontury)
+    in_frame = (
+        valid
+        & (FRAME_LEFT_MARGIN <= cx)
+        & (cx < FRAME_LEFT_MARGIN + FRAME_WIDTH)
+        & (FRAME_TOP_MARGIN <= cy)
+        & (cy < FRAME_TOP_MARGIN + FRAME_HEIGHT)
+    )
+    kontury = [kontur for kontur, ok in zip(kontury, in_frame) if ok]
     srodki = []
+    # Przyjęty środek (a, b) blokuje pasy |x - a| < 30 i |y - b| < 30;
+    # zamiast porównywać z każdym środkiem sprawdzamy tablice pasów
+    height, width = frame.shape[:2]
+    zajete_x = np.zeros(width, dtype=bool)
+    zajete_y = np.zeros(height, dtype=bool)
     for kontur in kontury:  # dla wszystkich konturów
         prostokat = cv.minAreaRect(kontur)
         (x, y), (szer, wys), _ = prostokat
         x = int(x)
         y = int(y)
-        rysuj = 1
-        if szer * wys > 2000:
-            for a, b in srodki:
-                if abs(a - x) < 30 or abs(b - y) < 30:
-                    rysuj = 0
-                    break
-            if rysuj:
-                obiektow = obiektow + 1
-                srodki.append((x, y))
+        if szer * wys > 2000 and not (zajete_x[x] or zajete_y[y]):
+            obiektow = obiektow + 1
+            srodki.append((x, y))
+            zajete_x[max(x - 29, 0) : x + 30] = True
+            zajete_y[max(y - 29, 0) : y + 30] = True
+
+    return kontury, srodki
+
+
+def detect_blobs(
+    prepared,
+    threshold=CONTOUR_BLOB_THRESHOLD,
+    invert=CONTOUR_BLOB_INVERT,
+    min_area=CONTOUR_BLOB_MIN_AREA,
+):
+    """Tryb "blobs": jedno progowanie ramki i `connectedComponentsWithStats`.
+
+    Pole, prostokąt otaczający i środek ciężkości wszystkich obiektów
+    przychodzą z jednego wywołania, bez pętli po konturach. Wynik ma format
+    `detect_contours`: kontury to prostokąty otaczające (4 wierzchołki),
+    a środki - środki ciężkości obiektów, których prostokąt ma pole > 2000
+    (jak minAreaRect w trybie krawędzi). Jedna składowa to jeden obiekt,
+    więc deduplikacja środków nie jest potrzebna.
+    """
+    left, top, width, height = prepared.roi
+    offset_x, offset_y = prepared.offset
+    gray = prepared.blurred[
+        top - offset_y : top - offset_y + height,
+        left - offset_x : left - offset_x + width,
+    ]
+    flags = cv.THRESH_BINARY_INV if invert else cv.THRESH_BINARY
+    if threshold is None:
+        flags |= cv.THRESH_OTSU
+        threshold = 0
+    _, binary = cv.threshold(gray, threshold, 255, flags)
+    _count, _labels, stats, centroids = cv.connectedComponentsWithStats(
+        binary, connectivity=8
+    )
+    # Etykieta 0 to tło
+    stats, centroids = stats[1:], centroids[1:]
+    keep = stats[:, cv.CC_STAT_AREA] >= min_area
+    stats, centroids = stats[keep], centroids[keep]
+
+    x0 = stats[:, cv.CC_STAT_LEFT] + left
+    y0 = stats[:, cv.CC_STAT_TOP] + top
+    x1 = x0 + stats[:, cv.CC_STAT_WIDTH] - 1
+    y1 = y0 + stats[:, cv.CC_STAT_HEIGHT] - 1
+    boxes = np.stack([x0, y0, x1, y0, x1, y1, x0, y1], axis=1).astype(np.int32)
+    kontury = list(boxes.reshape(-1, 4, 1, 2))
 
+    large = stats[:, cv.CC_STAT_WIDTH] * stats[:, cv.CC_STAT_HEIGHT] > 2000
+    centers = centroids[large].astype(np.int64) + (left, top)
+    srodki = [tuple(center) for center in centers.tolist()]
     return kontury, srodki
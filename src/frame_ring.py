@@ -0,0 +1,172 @@
+import threading
+import time
+
+import numpy as np
+
+
+class FrameRef:
+    """Widok (bez kopiowania) klatki z bufora pierścieniowego.
+
+    Dopóki referencja nie zostanie zwolniona (`release` lub blok `with`),
+    wątek czytający kamerę nie nadpisze jej slotu. Tablica `frame` jest
+    tylko do odczytu - do rysowania po klatce użyj `frame.copy()`.
+    """
+
+    __slots__ = ("seq", "timestamp", "frame", "_ring", "_slot")
+
+    def __init__(self, ring, slot, seq, timestamp, frame):
+        self._ring = ring
+        self._slot = slot
+        self.seq = seq
+        self.timestamp = timestamp
+        self.frame = frame
+
+    def release(self):
+        if self._ring is not None:
+            self._ring._unpin(self._slot)
+            self._ring = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def __del__(self):
+        self.release()
+
+
+class FrameRing:
+    """Bufor pierścieniowy N prealokowanych klatek z numerem i znacznikiem czasu.
+
+    Znaczniki czasu pochodzą z `time.monotonic()`. Bufory alokowane są przy
+    pierwszej klatce (lub gdy zmieni się jej rozmiar), potem są tylko
+    nadpisywane.
+    """
+
+    def __init__(self, size):
+        if size < 2:
+            raise ValueError("Bufor klatek musi mieć co najmniej 2 sloty")
+        self.size = size
+        self._cond = threading.Condition()
+        self._buffers = [None] * size
+        self._seq = [-1] * size
+        self._timestamps = [0.0] * size
+        self._pins = [0] * size
+        self._latest = -1
+        self._next_seq = 0
+        self._closed = False
+
+    # --- strona zapisu (wątek kamery) ---
+
+    def begin_write(self):
+        """Zarezerwuj slot do zapisu. Zwraca (indeks, bufor albo None)."""
+        with self._cond:
+            slot = self._latest
+            for _ in range(self.size):
+                slot = (slot + 1) % self.size
+                if self._pins[slot] == 0:
+                    break
+            else:
+                return None, None
+            # Slot w trakcie zapisu nie jest widoczny dla czytelników
+            self._seq[slot] = -1
+            return slot, self._buffers[slot]
+
+    def commit(self, slot, frame, timestamp=None):
+        """Opublikuj klatkę zapisaną w slocie. Jeśli `frame` nie jest buforem
+        slotu (np. backend zwrócił nową tablicę), zostanie do niego skopiowana.
+        Zwraca numer opublikowanej klatki."""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        buffer = self._buffers[slot]
+        if frame is not buffer:
+            if buffer is None or buffer.shape != frame.shape:
+                buffer = np.empty_like(frame)
+                self._buffers[slot] = buffer
+            np.copyto(buffer, frame)
+        with self._cond:
+            seq = self._next_seq
+            self._seq[slot] = seq
+            self._timestamps[slot] = timestamp
+            self._next_seq += 1
+            self._latest = slot
+            self._cond.notify_all()
+        return seq
+
+    # --- strona odczytu ---
+
+    def _ref(self, slot):
+        # wywoływane z założonym self._cond
+        self._pins[slot] += 1
+        view = self._buffers[slot].view()
+        view.flags.writeable = False
+        return FrameRef(self, slot, self._seq[slot], self._timestamps[slot], view)
+
+    def _unpin(self, slot):
+        with self._cond:
+            self._pins[slot] -= 1
+
+    @property
+    def latest_seq(self):
+        with self._cond:
+            return self._seq[self._latest] if self._latest >= 0 else -1
+
+    def latest(self):
+        """Najnowsza klatka albo None, jeśli kamera nic jeszcze nie dostarczyła."""
+        with self._cond:
+            if self._latest < 0 or self._seq[self._latest] < 0:
+                return None
+            return self._ref(self._latest)
+
+    def since(self, timestamp):
+        """Wszystkie dostępne klatki wykonane po `timestamp`, od najstarszej."""
+        with self._cond:
+            slots = [
+                slot
+                for slot in range(self.size)
+                if self._seq[slot] >= 0 and self._timestamps[slot] > timestamp
+            ]
+            slots.sort(key=lambda slot: self._seq[slot])
+            return [self._ref(slot) for slot in slots]
+
+    def wait_next(self, after_seq=None, timeout=None):
+        """Czekaj na klatkę o numerze większym niż `after_seq` (domyślnie:
+        większym niż najnowsza w chwili wywołania). Zwraca None po timeoucie."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if after_seq is None:
+                after_seq = self._seq[self._latest] if self._latest >= 0 else -1
+            while not self._closed:
+                if self._latest >= 0 and self._seq[self._latest] > after_seq:
+                    return self._ref(self._latest)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return None
+
+    def first_after(self, timestamp, timeout=None):
+        """Pierwsza klatka wykonana po `timestamp` - z bufora, a jeśli takiej
+        jeszcze nie ma, czeka na nią. Zwraca None po timeoucie."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._closed:
+                candidates = [
+                    slot
+                    for slot in range(self.size)
+                    if self._seq[slot] >= 0 and self._timestamps[slot] > timestamp
+                ]
+                if candidates:
+                    return self._ref(min(candidates, key=lambda slot: self._seq[slot]))
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return None
+
+    def close(self):
+        """Zakończ oczekiwanie w `wait_next` (np. przy zamykaniu kamery)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
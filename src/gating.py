@@ -0,0 +1,138 @@
+import time
+
+import cv2 as cv
+import numpy as np
+
+from .config import (
+    GATE_SCALE,
+    GATE_PIXEL_THRESHOLD,
+    GATE_CHANGED_FRACTION,
+    GATE_BACKGROUND_RATE,
+    GATE_MAX_SKIP,
+)
+from .metrics import elapsed_ms, metrics
+from .preprocessing import PreparedFrame
+
+
+def _is_empty(result):
+    return not result.get("circles") and not result.get("contours", [[], []])[1]
+
+
+class MotionGate:
+    """Tani etap przed detekcją dla trybów ciągłych (live, analiza wstępna).
+
+    Sygnaturą klatki jest ramka (roi) pomniejszona `scale` razy w skali
+    szarości. Detekcja jest pomijana, gdy:
+    - "static" - sygnatura prawie nie różni się od ostatnio analizowanej
+      klatki: zwracany jest poprzedni wynik,
+    - "empty" - sygnatura pasuje do modelu tła (pusty pas), uczonego na
+      klatkach, na których detekcja nie znalazła kół ani konturów: wynik
+      ostatniej pustej klatki.
+    Po `max_skip` pominięciach z rzędu detekcja wykonywana jest i tak.
+
+    Czas CPU detekcji (`time.thread_time`) jest uśredniany, a za każdą
+    pominiętą klatkę do `gate_cpu_saved_ms` dodawany jest ten średni czas
+    pomniejszony o koszt samej bramki.
+    """
+
+    def __init__(
+        self,
+        scale=GATE_SCALE,
+        pixel_threshold=GATE_PIXEL_THRESHOLD,
+        changed_fraction=GATE_CHANGED_FRACTION,
+        background_rate=GATE_BACKGROUND_RATE,
+        max_skip=GATE_MAX_SKIP,
+    ):
+        self.scale = scale
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.background_rate = background_rate
+        self.max_skip = max_skip
+        self.frames = 0
+        self.skipped = 0
+        self.cpu_saved_ms = 0.0
+        self._last_signature = None
+        self._last_result = None
+        self._background = None  # float32, średnia krocząca pustych klatek
+        self._empty_result = None
+        self._skipped_in_row = 0
+        self._detect_cpu_ms = None  # średnia krocząca czasu CPU detekcji
+
+    def signature(self, frame, prepared=None):
+        if prepared is None:
+            prepared = PreparedFrame(frame)
+        roi = prepared.roi_view
+        size = (max(roi.shape[1] // self.scale, 1), max(roi.shape[0] // self.scale, 1))
+        small = cv.resize(roi, size, interpolation=cv.INTER_AREA)
+        return cv.cvtColor(small, cv.COLOR_BGR2GRAY)
+
+    def _changed(self, signature, reference):
+        diff = cv.absdiff(signature, reference)
+        changed = np.count_nonzero(diff > self.pixel_threshold)
+        return changed > self.changed_fraction * diff.size
+
+    def _decide(self, signature):
+        if self._skipped_in_row >= self.max_skip:
+            return None
+        if self._last_signature is not None and not self._changed(
+            signature, self._last_signature
+        ):
+            return "static"
+        if self._background is not None and not self._changed(
+            signature, cv.convertScaleAbs(self._background)
+        ):
+            return "empty"
+        return None
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def run(self, frame, detect, prepared=None):
+        """Zwraca wynik `detect()` albo, gdy nic się nie zmieniło, wynik
+        ponownie użyty. Drugi element to powód pominięcia (None = detekcja)."""
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        signature = self.signature(frame, prepared)
+        reason = self._decide(signature)
+        gate_cpu_ms = (time.thread_time() - cpu_start) * 1000
+        metrics.observe("gate_ms", elapsed_ms(start))
+        self.frames += 1
+
+        if reason is not None:
+            self.skipped += 1
+            self._skipped_in_row += 1
+            metrics.inc(f"gate_skipped_{reason}")
+            if reason == "empty":
+                # Powolne dopasowanie tła do zmian oświetlenia
+                cv.accumulateWeighted(signature, self._background, self.background_rate)
+                result = self._empty_result
+            else:
+                result = self._last_result
+            if self._detect_cpu_ms is not None:
+                saved = max(self._detect_cpu_ms - gate_cpu_ms, 0.0)
+                self.cpu_saved_ms += saved
+                metrics.inc("gate_cpu_saved_ms", saved)
+        else:
+            cpu_start = time.thread_time()
+            result = detect()
+            cpu_ms = (time.thread_time() - cpu_start) * 1000
+            self._detect_cpu_ms = (
+                cpu_ms
+                if self._detect_cpu_ms is None
+                else 0.9 * self._detect_cpu_ms + 0.1 * cpu_ms
+            )
+            self._skipped_in_row = 0
+            self._last_signature = signature
+            self._last_result = result
+            if _is_empty(result):
+                self._empty_result = result
+                if self._background is None:
+                    self._background = signature.astype(np.float32)
+                else:
+                    cv.accumulateWeighted(
+                        signature, self._background, self.background_rate
+                    )
+
+        metrics.set("gate_skip_ratio", round(self.skip_ratio, 3))
+        return result, reason
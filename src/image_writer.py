@@ -0,0 +1,145 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import cv2 as cv
+
+from .annotations import annotate_frame
+from .config import IMAGE_QUEUE_SIZE, IMAGE_QUEUE_DROP_POLICY
+from .metrics import elapsed_ms, metrics
+from .preprocessing import prepare_frame
+
+logger = logging.getLogger("system_wizyjny")
+
+DROP_NEWEST = "drop_newest"  # odrzuć nowy obraz, gdy kolejka jest pełna
+DROP_OLDEST = "drop_oldest"  # usuń najstarszy obraz z kolejki i dodaj nowy
+BLOCK = "block"  # czekaj na miejsce w kolejce (spowalnia analizę!)
+
+
+def save_image_with_metadata(frame, result, timestamp=None, roi=None):
+    save_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "wizja_zdjecia")
+    save_dir_ann = os.path.join(save_dir, "annotated")
+    save_dir_metadata = os.path.join(save_dir, "metadata")
+    save_dir_raw = os.path.join(save_dir, "raw")
+
+    os.makedirs(save_dir_raw, exist_ok=True)
+    os.makedirs(save_dir_ann, exist_ok=True)
+    os.makedirs(save_dir_metadata, exist_ok=True)
+
+    if timestamp is None:
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+
+    filepath_plain = os.path.join(save_dir_raw, f"wizja_{timestamp}.jpg")
+    filepath_ann = os.path.join(save_dir_ann, f"wizja_{timestamp}_ann.jpg")
+    filepath_metadata = os.path.join(save_dir_metadata, f"wizja_{timestamp}.json")
+
+    # Zapisz obrazek bez oznaczeń (oryginalny frame)
+    cv.imwrite(filepath_plain, frame)
+
+    # Zapisz obrazek z oznaczeniami - ramka ta sama co w analizie
+    # (`roi` jak w `prepare_frame`, domyślnie INSPECTION_ROI)
+    annotate_frame(frame, result, prepared=prepare_frame(frame, roi))
+    cv.imwrite(filepath_ann, frame)
+
+    # Zapis metadanych
+    with open(filepath_metadata, "w") as f:
+        json.dump(result, f)
+
+
+class ImageWriter:
+    """Zapis zdjęć z analizy w tle, przez ograniczoną kolejkę.
+
+    `submit` tylko kopiuje klatkę i wrzuca ją do kolejki - kodowanie JPEG
+    i zapis na kartę SD odbywają się w osobnym wątku, już po odesłaniu
+    wyniku do PLC.
+    """
+
+    def __init__(self, maxsize=IMAGE_QUEUE_SIZE, drop_policy=IMAGE_QUEUE_DROP_POLICY):
+        if drop_policy not in (DROP_NEWEST, DROP_OLDEST, BLOCK):
+            raise ValueError(f"Nieznana polityka kolejki: {drop_policy}")
+        self.drop_policy = drop_policy
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        # Raz na obiekt - `start` wywoływany jest przy każdym `submit`
+        atexit.register(self.stop)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="image-writer", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, frame, result, roi=None):
+        """Dodaj obraz do zapisu; `roi` (x, y, szerokość, wysokość) to ramka
+        inspekcji z analizy. Zwraca False, jeśli obraz został odrzucony."""
+        self.start()
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        item = (frame.copy(), result, timestamp, roi, time.perf_counter())
+        if self.drop_policy == BLOCK:
+            self._queue.put(item)
+        elif self.drop_policy == DROP_OLDEST:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self._queue.task_done()
+                        self._dropped()
+                    except queue.Empty:
+                        pass
+        else:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self._dropped()
+                return False
+        metrics.inc("image_writer_queued")
+        metrics.set("image_writer_queue_depth", self._queue.qsize())
+        return True
+
+    def _dropped(self):
+        metrics.inc("image_writer_dropped")
+        logger.warning("Kolejka zapisu zdjęć pełna - pomijam zdjęcie")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                frame, result, timestamp, roi, queued_at = item
+                start = time.perf_counter()
+                save_image_with_metadata(frame, result, timestamp, roi)
+                metrics.observe("image_write_ms", elapsed_ms(start))
+                metrics.observe("image_write_delay_ms", elapsed_ms(queued_at))
+                metrics.inc("image_writer_written")
+            except Exception as e:
+                metrics.inc("image_writer_errors")
+                logger.exception(f"Błąd zapisu zdjęcia: {e}")
+            finally:
+                self._queue.task_done()
+                metrics.set("image_writer_queue_depth", self._queue.qsize())
+
+    def stop(self, timeout=5.0):
+        """Zapisz zaległe obrazy i zatrzymaj wątek."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(None)
+        thread.join(timeout=timeout)
+
+
+image_writer = ImageWriter()
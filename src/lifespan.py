@@ -4,9 +4,13 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from src.image_writer import image_writer
 from src.logging_utils import setup_in_memory_logging
+from src.metrics import monitor_event_loop_lag
 from src.plc_connection import monitor_and_analyze
 from src.state import camera, data_store, linia, shutdown_event
+from src.stats import get_stats
+from src.vision_executor import shutdown_vision_executor
 
 
 @asynccontextmanager
@@ -15,12 +19,23 @@ async def lifespan(app: FastAPI):
     shutdown_event.clear()
     handler = setup_in_memory_logging("system_wizyjny", level=logging.INFO, maxlen=100)
     app.state.log_handler = handler
-    asyncio.create_task(
+    stats = get_stats()
+    stats.start_autoflush()
+    monitor_task = asyncio.create_task(
         monitor_and_analyze(data_store=data_store, linia=linia, camera=camera)
     )
+    asyncio.create_task(monitor_event_loop_lag(shutdown_event))
     try:
         yield
     finally:
         shutdown_event.set()
+        # Bez nowych analiz, potem kolejno: trwająca analiza (korzysta z kamery
+        # i zleca zapis zdjęcia), kamera, zapis zdjęć - w wątku, żeby
+        # oczekiwanie nie blokowało pętli zdarzeń
+        monitor_task.cancel()
+        await asyncio.gather(monitor_task, return_exceptions=True)
+        await asyncio.to_thread(shutdown_vision_executor)
         if camera is not None:
-            camera.stop()
+            await asyncio.to_thread(camera.stop)
+        await asyncio.to_thread(image_writer.stop)
+        stats.stop_autoflush()
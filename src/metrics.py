@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from .config import EVENT_LOOP_LAG_INTERVAL, METRICS_WINDOW
+
+
+def percentile(values, q):
+    """Percentyl q (0-100) z listy wartości, interpolacja liniowa."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class Metrics:
+    """Metryki czasu działania trzymane w pamięci (nie są zapisywane na dysk).
+
+    - liczniki (`inc`),
+    - wartości chwilowe (`set`),
+    - pomiary (`observe`) - podsumowanie z ostatnich `window` próbek.
+    """
+
+    def __init__(self, window=METRICS_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self._counters = {}
+        self._gauges = {}
+        self._samples = {}
+        self._totals = {}
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, value):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self._window)
+                self._totals[name] = [0, 0.0, value]
+            samples.append(value)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += value
+            totals[2] = max(totals[2], value)
+
+    def get(self, name, default=0):
+        with self._lock:
+            return self._counters.get(name, self._gauges.get(name, default))
+
+    def summary(self, name):
+        with self._lock:
+            samples = list(self._samples.get(name, ()))
+            count, total, max_value = self._totals.get(name, (0, 0.0, None))
+        return {
+            "count": count,
+            "mean": total / count if count else None,
+            "max": max_value,
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99),
+        }
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            names = list(self._samples)
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "summaries": {name: self.summary(name) for name in names},
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._samples.clear()
+            self._totals.clear()
+
+
+metrics = Metrics()
+
+
+async def monitor_event_loop_lag(stop_event, interval=EVENT_LOOP_LAG_INTERVAL):
+    """Mierzy, o ile dłużej niż `interval` pętla zdarzeń nie oddawała sterowania.
+
+    Wynik (ms) trafia do metryki `event_loop_lag_ms`.
+    """
+    loop = asyncio.get_running_loop()
+    while not stop_event.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        metrics.observe("event_loop_lag_ms", lag * 1000)
+
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
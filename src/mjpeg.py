@@ -0,0 +1,117 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+
+from .metrics import metrics
+
+FPS_WINDOW = 30  # liczba ostatnich wysłanych klatek do liczenia fps klienta
+
+
+class _Subscriber:
+    def __init__(self, client_id, loop):
+        self.id = client_id
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.index = None  # numer ostatnio wysłanej klatki
+        self.sent = 0
+        self.dropped = 0
+        self.connected_at = time.monotonic()
+        self.send_times = deque(maxlen=FPS_WINDOW)
+
+    def fps(self):
+        if len(self.send_times) < 2:
+            return 0.0
+        span = self.send_times[-1] - self.send_times[0]
+        return (len(self.send_times) - 1) / span if span > 0 else 0.0
+
+
+class MjpegBroadcaster:
+    """Rozsyła zakodowane klatki JPEG do klientów MJPEG.
+
+    Wątek kamery wywołuje `publish` dla każdej nowej klatki. Fragment
+    multipart budowany jest raz i współdzielony przez wszystkich klientów.
+    Klient, który nie nadąża, dostaje od razu najnowszą klatkę - zaległe są
+    pomijane (liczone jako `dropped`), a nie kolejkowane.
+    """
+
+    def __init__(self, boundary=b"frame"):
+        self.boundary = boundary
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+        self._latest = (0, None)  # (numer publikacji, fragment multipart)
+        self._closed = False
+
+    @property
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, jpeg):
+        chunk = (
+            b"--" + self.boundary + b"\r\n"
+            b"Content-Type: image/jpeg\r\n"
+            b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n"
+        )
+        with self._lock:
+            self._latest = (self._latest[0] + 1, chunk)
+            subscribers = list(self._subscribers.values())
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.event.set)
+            except RuntimeError:
+                # Pętla klienta już zamknięta
+                pass
+
+    async def stream(self):
+        """Generator fragmentów multipart dla jednego klienta."""
+        sub = _Subscriber(next(self._ids), asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[sub.id] = sub
+        metrics.set("mjpeg_clients", len(self._subscribers))
+        try:
+            while not self._closed:
+                await sub.event.wait()
+                sub.event.clear()
+                index, chunk = self._latest
+                if chunk is None or index == sub.index:
+                    continue
+                if sub.index is not None and index > sub.index + 1:
+                    skipped = index - sub.index - 1
+                    sub.dropped += skipped
+                    metrics.inc("mjpeg_dropped", skipped)
+                sub.index = index
+                yield chunk
+                sub.sent += 1
+                sub.send_times.append(time.monotonic())
+                metrics.inc("mjpeg_sent")
+        finally:
+            with self._lock:
+                self._subscribers.pop(sub.id, None)
+            metrics.set("mjpeg_clients", len(self._subscribers))
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        now = time.monotonic()
+        return [
+            {
+                "id": sub.id,
+                "fps": round(sub.fps(), 1),
+                "sent": sub.sent,
+                "dropped": sub.dropped,
+                "connected_s": round(now - sub.connected_at, 1),
+            }
+            for sub in subscribers
+        ]
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.event.set)
+            except RuntimeError:
+                pass
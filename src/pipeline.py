@@ -0,0 +1,190 @@
+import sys
+import time
+
+from .annotations import annotate_frame
+from .circles import classify_circles, find_circles
+from .config import CIRCLE_PYRAMID, PIPELINE_STAGES
+from .contours import detect_contours
+from .image_writer import image_writer
+from .metrics import elapsed_ms, metrics
+from .preprocessing import prepare_frame
+
+# Etapy, bez których analiza nie ma klatki ani wyniku - nie da się ich wyłączyć
+REQUIRED_STAGES = ("capture", "preprocess", "circles", "color")
+
+
+class FrameContext:
+    """Stan jednej klatki przekazywany między etapami potoku."""
+
+    def __init__(self, frame=None, capture=None, roi=None, prepared=None, params={}):
+        self.frame = frame
+        self.frame_ref = None  # FrameRef z bufora kamery (etap capture)
+        self.capture = capture  # funkcja zwracająca FrameRef albo None
+        self.roi = roi
+        self._prepared = prepared
+        self.params = params
+        self.positions = []  # koła (x, y, r) przed klasyfikacją koloru
+        self.needs = set()  # przekształcenia liczone w etapie preprocess
+        self.results = {"contours": [[], []], "circles": []}
+        self.timings = {}
+
+    @property
+    def prepared(self):
+        # Tworzone przy pierwszym użyciu - także gdy etap preprocess jest wyłączony
+        if self._prepared is None:
+            self._prepared = prepare_frame(self.frame, self.roi)
+        return self._prepared
+
+
+class Stage:
+    """Etap potoku: `run(ctx)` zmienia kontekst, `size(ctx)` to wielkość
+    wejścia etapu w jednostkach `unit`, a `needs(ctx)` - przekształcenia
+    `PreparedFrame`, z których etap korzysta (liczone w etapie preprocess)."""
+
+    def __init__(self, name, run, size, unit, needs=lambda ctx: ()):
+        self.name = name
+        self.run = run
+        self.size = size
+        self.unit = unit
+        self.needs = needs
+
+
+class Pipeline:
+    """Analiza klatki jako lista zadeklarowanych etapów.
+
+    `run` wykonuje po kolei etapy z `enabled` i dla każdego zapisuje w
+    `ctx.results["pipeline"]` czas (ms), wielkość wejścia i przyrost liczby
+    bloków pamięci interpretera (`sys.getallocatedblocks` - obiekty Pythona,
+    bez buforów numpy/OpenCV). Czasy trafiają też do metryk
+    `pipeline_<etap>_ms`. Bez klatki (capture nic nie zwrócił) potok staje.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+    @property
+    def names(self):
+        return [stage.name for stage in self.stages]
+
+    def run(self, ctx, enabled):
+        active = [stage for stage in self.stages if stage.name in enabled]
+        ctx.needs = {need for stage in active for need in stage.needs(ctx)}
+        for stage in active:
+            if ctx.frame is None and stage.name != "capture":
+                break
+            blocks = sys.getallocatedblocks()
+            start = time.perf_counter()
+            stage.run(ctx)
+            ms = elapsed_ms(start)
+            allocs = sys.getallocatedblocks() - blocks
+            metrics.observe(f"pipeline_{stage.name}_ms", ms)
+            ctx.timings[stage.name] = {
+                "ms": round(ms, 3),
+                "input": stage.size(ctx),
+                "unit": stage.unit,
+                "allocs": allocs,
+            }
+        # Nowy słownik - wynik mógł już trafić do zapisu w innym wątku
+        ctx.results["pipeline"] = dict(ctx.timings)
+        return ctx
+
+
+def enabled_stages(
+    contours=False,
+    circles=True,
+    annotate=True,
+    capture=False,
+    persist=False,
+    stages=None,
+):
+    """Etapy wynikające z argumentów wywołania, ograniczone do `stages`
+    (domyślnie `PIPELINE_STAGES` z konfiguracji, np. z CLI `--stages`).
+    Etapy z `REQUIRED_STAGES` zostają zawsze, gdy wynikają z wywołania."""
+    wanted = {"preprocess"}
+    if capture:
+        wanted.add("capture")
+    if circles:
+        wanted.update(("circles", "color"))
+    if contours:
+        wanted.add("contours")
+    if annotate:
+        wanted.add("annotate")
+    if persist:
+        wanted.add("persist")
+    if stages is None:
+        stages = PIPELINE_STAGES
+    return wanted & (set(stages) | set(REQUIRED_STAGES))
+
+
+# --- etapy analizy klatki ---
+
+
+def _frame_px(ctx):
+    return ctx.frame.shape[0] * ctx.frame.shape[1]
+
+
+def _window_px(ctx):
+    x0, y0, x1, y1 = ctx.prepared.window
+    return (x1 - x0) * (y1 - y0)
+
+
+def _capture(ctx):
+    ctx.frame_ref = ctx.capture()
+    if ctx.frame_ref is not None:
+        ctx.frame = ctx.frame_ref.frame
+
+
+def _preprocess(ctx):
+    # Przekształcenia są leniwe - liczymy tu te, których użyją dalsze etapy,
+    # żeby ich koszt był widoczny w tym etapie, a nie w detektorach
+    for need in sorted(ctx.needs):
+        getattr(ctx.prepared, need)
+
+
+def _circles_needs(ctx):
+    return ("gray",) if ctx.params.get("pyramid", CIRCLE_PYRAMID) else ("blurred",)
+
+
+def _circles(ctx):
+    ctx.positions = find_circles(
+        ctx.frame, *ctx.prepared.roi, params=ctx.params, prepared=ctx.prepared
+    )
+    # Bez etapu color koła zostają bez klasyfikacji
+    ctx.results["circles"] = [
+        {"x": a, "y": b, "r": r, "color": None, "hsv": [0.0, 0.0, 0.0]}
+        for a, b, r in ctx.positions
+    ]
+
+
+def _color(ctx):
+    ctx.results["circles"] = classify_circles(
+        ctx.positions, ctx.prepared, params=ctx.params
+    )
+
+
+def _contours(ctx):
+    ctx.results["contours"] = detect_contours(
+        ctx.frame, *ctx.prepared.roi, prepared=ctx.prepared
+    )
+
+
+def _annotate(ctx):
+    annotate_frame(ctx.frame, ctx.results, prepared=ctx.prepared)
+
+
+def _persist(ctx):
+    # Kopia wyniku: czas etapu persist dopisywany jest już po przekazaniu do zapisu
+    image_writer.submit(ctx.frame, dict(ctx.results), roi=ctx.prepared.roi)
+
+
+VISION_STAGES = (
+    Stage("capture", _capture, lambda ctx: getattr(ctx.frame, "nbytes", 0), "B"),
+    Stage("preprocess", _preprocess, _window_px, "px"),
+    Stage("circles", _circles, _window_px, "px", needs=_circles_needs),
+    # HSV liczone w etapie color - tylko gdy są koła do klasyfikacji
+    Stage("color", _color, lambda ctx: len(ctx.positions), "circles"),
+    Stage("contours", _contours, _window_px, "px", needs=lambda ctx: ("blurred",)),
+    Stage("annotate", _annotate, _frame_px, "px"),
+    Stage("persist", _persist, lambda ctx: ctx.frame.nbytes, "B"),
+)
+vision_pipeline = Pipeline(VISION_STAGES)
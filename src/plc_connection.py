@@ -1,11 +1,27 @@
 import asyncio
 import logging
+import socket
+import threading
+import time
+from datetime import datetime
 
 from .leds import *
 
 led_ctrl = WS2812Flash()
 
-from .wizja import wizja_still
+from .config import (
+    PLC_POLL_FAST,
+    PLC_POLL_IDLE,
+    PLC_POLL_IDLE_AFTER,
+    PLC_POLL_BACKOFF,
+    PLC_WRITE_BATCH_WINDOW,
+    PLC_WRITE_MERGE_GAP,
+    PREANALYSIS_ENABLED,
+)
+from .metrics import elapsed_ms, metrics
+from .preanalysis import PreAnalyzer
+from .vision_process import VisionProcess
+from .wizja import wizja_still_async
 from snap7_easy_vars import (
     PLCData,
     PLCBoolField,
@@ -81,6 +97,19 @@ class LiniaDataStore(PLCData):
 
     tryb_auto = PLCBoolField(14, 1, settable=True)
 
+    def __init__(self, **initial_values):
+        # Pola ustawione lokalnie od ostatniego zapisu do PLC
+        self._dirty = set()
+        # Ostatni znany stan DB1 w PLC (po odczycie / zapisie); None = nieznany
+        self._plc_image = None
+        super().__init__(**initial_values)
+
+    def __setattr__(self, name, value):
+        # Każde przypisanie pola (także przez `set_data`) to zmiana lokalna
+        if name in self._fields:
+            self._dirty.add(name)
+        super().__setattr__(name, value)
+
     def notify_subscribers(self):
         super().notify_subscribers()
         if self.system_wizyjny_on_off:
@@ -88,9 +117,209 @@ class LiniaDataStore(PLCData):
         else:
             led_ctrl.flash_off()
 
+    def from_bytes(self, raw: bytes):
+        # Zmiany lokalne jeszcze niezapisane do PLC mają pierwszeństwo przed
+        # odczytem; pierwszy odczyt tylko ustala stan PLC
+        self._dirty = set(self.dirty_fields())
+        pending = {name: self._values[name] for name in self._dirty}
+        for name, field in self._fields.items():
+            self._values[name] = field.read(raw, self._values[name])
+        self._plc_image = bytes(raw)
+        self._values.update(pending)
+        self.notify_subscribers()
+
+    def dirty_fields(self):
+        """Pola ustawione lokalnie od ostatniego zapisu, których wartość różni
+        się od ostatniego stanu PLC."""
+        dirty = [name for name in self._fields if name in self._dirty]
+        if self._plc_image is None:
+            return dirty
+        buffer = bytearray(self._plc_image)
+        changed = []
+        for name in dirty:
+            field = self._fields[name]
+            span = slice(field.byte_offset, field.byte_offset + field.size)
+            before = bytes(buffer[span])
+            field.write(buffer, getattr(self, name))
+            if buffer[span] != before:
+                changed.append(name)
+        return changed
+
+    def dirty_ranges(self, merge_gap=PLC_WRITE_MERGE_GAP):
+        """Minimalne spójne zakresy bajtów do zapisu: lista (offset, bytes).
+
+        Zakresy oddalone o najwyżej `merge_gap` bajtów są łączone - jedno
+        zapytanie snap7 jest tańsze niż kilka bajtów więcej.
+        """
+        dirty = self.dirty_fields()
+        if not dirty:
+            return []
+        if self._plc_image is None:
+            buffer = bytearray(self.to_bytes())
+        else:
+            # Startujemy od stanu PLC, żeby nie nadpisać bitów spoza opisanych
+            # pól ani pól, których nie zmieniono lokalnie
+            buffer = bytearray(self._plc_image)
+            for name in dirty:
+                self._fields[name].write(buffer, getattr(self, name))
+        offsets = sorted(
+            {
+                offset
+                for name in dirty
+                for offset in range(
+                    self._fields[name].byte_offset,
+                    self._fields[name].byte_offset + self._fields[name].size,
+                )
+            }
+        )
+        ranges = []
+        start = end = offsets[0]
+        for offset in offsets[1:]:
+            if offset - end - 1 <= merge_gap:
+                end = offset
+            else:
+                ranges.append((start, bytes(buffer[start : end + 1])))
+                start = end = offset
+        ranges.append((start, bytes(buffer[start : end + 1])))
+        return ranges
+
+    def mark_written(self, ranges):
+        image = bytearray(self._plc_image or self.to_bytes())
+        for start, data in ranges:
+            image[start : start + len(data)] = data
+        self._plc_image = bytes(image)
+        # Zapis idzie w wątku - pole zmienione w tym czasie nadal czeka na zapis
+        self._dirty = set(self.dirty_fields())
+
 
 class LiniaConnection(PLCConnection):
-    pass
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending_write = None
+        # Klient snap7 nie jest bezpieczny wątkowo - odczyt i zapis idą w wątkach
+        self._client_lock = threading.Lock()
+
+    def _open(self):
+        """Połączenie TCP + snap7 bez zmian w magazynie danych, więc może
+        działać w wątku poza pętlą zdarzeń. Zwraca True, gdy klient jest
+        połączony."""
+        try:
+            with self._client_lock:
+                if self.client.get_connected():
+                    return True
+        except Exception as e:
+            logger.error(f"Error while checking PLC connection state: {e}")
+            return False
+
+        # Wstępne połączenie TCP z limitem czasu - snap7.connect potrafi wisieć
+        try:
+            with socket.create_connection(
+                (self.ip_address, self.port), timeout=self.connect_timeout
+            ):
+                pass
+        except Exception as e:
+            logger.error(
+                f"Timeout/error while establishing TCP connection to PLC "
+                f"{self.ip_address}:{self.port} within "
+                f"{self.connect_timeout:.1f}s: {e}"
+            )
+            return False
+
+        try:
+            with self._client_lock:
+                self.client.connect(self.ip_address, self.rack, self.slot, self.port)
+        except Exception as e:
+            logger.error(f"PLC connection error: {e}")
+            return False
+
+        logger.info("Connected to PLC.")
+        return True
+
+    def connect(self):
+        if not self._open():
+            return False
+        self.data_store.last_connected = datetime.now()
+        return True
+
+    def _read_raw(self):
+        """Połączenie (w razie potrzeby) i odczyt DB: surowe bajty albo None."""
+        if not self._open():
+            return None
+        with self._client_lock:
+            try:
+                return self.client.db_read(
+                    self.db_number, 0, self.data_store.buffer_size()
+                )
+            except Exception as e:
+                logger.error(f"Error reading data from PLC: {e}")
+                return None
+
+    async def read_async(self):
+        """Odpowiednik `read`, który nie blokuje pętli zdarzeń: połączenie
+        i `db_read` w wątku, aktualizacja magazynu danych (subskrybenci,
+        `last_connected`) w pętli. Bez połączenia jedna próba na wywołanie."""
+        raw = await asyncio.to_thread(self._read_raw)
+        if raw is None:
+            return False
+        self.data_store.from_bytes(raw)
+        self.data_store.last_connected = datetime.now()
+        return True
+
+    def _write_ranges(self, ranges):
+        """Połączenie (w razie potrzeby) i zapis zakresów bajtów do DB - bez
+        zmian w magazynie danych, więc może działać w wątku."""
+        if not self._open():
+            return False
+        try:
+            with self._client_lock:
+                for start, data in ranges:
+                    self.client.db_write(self.db_number, start, data)
+                    metrics.inc("plc_write_requests")
+                    metrics.inc("plc_write_bytes", len(data))
+        except Exception as e:
+            logger.error(f"Error writing data to PLC: {e}")
+            return False
+        return True
+
+    def write(self):
+        """
+        Writes only the bytes changed since the last read/write to the PLC.
+        """
+        ranges = self.data_store.dirty_ranges()
+        if not ranges:
+            return True
+        if not self._write_ranges(ranges):
+            return False
+        self.data_store.mark_written(ranges)
+        self.data_store.last_connected = datetime.now()
+        return True
+
+    async def write_async(self):
+        """Odpowiednik `write`, który nie blokuje pętli zdarzeń: połączenie
+        i `db_write` w wątku, `mark_written` w pętli."""
+        ranges = self.data_store.dirty_ranges()
+        if not ranges:
+            return True
+        if not await asyncio.to_thread(self._write_ranges, ranges):
+            return False
+        self.data_store.mark_written(ranges)
+        self.data_store.last_connected = datetime.now()
+        return True
+
+    async def write_batched(self, delay=PLC_WRITE_BATCH_WINDOW):
+        """Zapis zbiorczy: zmiany z wielu `set_data` w oknie `delay` sekund
+        trafiają do PLC jednym `write_async`. Zwraca wynik tego zapisu."""
+        if self._pending_write is None:
+            self._pending_write = asyncio.create_task(self._flush_after(delay))
+        else:
+            metrics.inc("plc_writes_batched")
+        return await asyncio.shield(self._pending_write)
+
+    async def _flush_after(self, delay):
+        await asyncio.sleep(delay)
+        # Zmiany od tej chwili trafiają już do kolejnej partii
+        self._pending_write = None
+        return await self.write_async()
 
 
 def _should_detect_red_circle(result: dict) -> bool:
@@ -104,39 +333,121 @@ def _should_detect_red_circle(result: dict) -> bool:
         return False
 
 
-async def monitor_and_analyze(data_store, linia, camera):
-    while True:
-        try:
-            linia.read()
-            if data_store.analyze:
-                logger.info("Start analizy!")
-                try:
-                    # Tutaj można dodać kod do analizy danych
-                    wizja_result = wizja_still(camera=camera)
-                    logger.info(f"Wynik analizy: {wizja_result}")
-                    if _should_detect_red_circle(wizja_result):
-                        logger.info("Wykryto czerwone koło, zapisuję wynik jako 1...")
-                        data_store.result = 1
-                    else:
-                        logger.info(
-                            "Nie wykryto czerwonego koła, zapisuję wynik jako 0..."
-                        )
-                        data_store.result = 0
-
-                    data_store.error = 0
-                    data_store.finished = 1
-                except Exception as e:
-                    logger.exception(f"Błąd podczas analizy: {e}")
-                    data_store.error = 1
-
-                data_store.set_data(analyze=0)
-
-                linia.write()
-                logger.info("Analiza zakończona, wynik zapisany.")
-        except Exception as e:
-            logger.exception(str(e))
-
-        await asyncio.sleep(0.2)
+def _line_active(data_store) -> bool:
+    return bool(
+        data_store.tryb_auto or data_store.klocek_w_podajniku or data_store.analyze
+    )
+
+
+class AdaptivePoller:
+    """Dobiera okres odpytywania PLC: szybko, gdy linia pracuje (tryb auto,
+    element w podajniku), i stopniowo wolniej, gdy od `idle_after` sekund nic
+    się nie dzieje."""
+
+    def __init__(
+        self,
+        fast=PLC_POLL_FAST,
+        idle=PLC_POLL_IDLE,
+        idle_after=PLC_POLL_IDLE_AFTER,
+        backoff=PLC_POLL_BACKOFF,
+    ):
+        self.fast = fast
+        self.idle = idle
+        self.idle_after = idle_after
+        self.backoff = backoff
+        self.interval = idle
+        self._last_active = None
+
+    def next_interval(self, active, now=None):
+        if now is None:
+            now = time.monotonic()
+        if active:
+            self._last_active = now
+            self.interval = self.fast
+        elif self._last_active is None or now - self._last_active >= self.idle_after:
+            self.interval = min(self.idle, self.interval * self.backoff)
+        return self.interval
+
+
+async def monitor_and_analyze(
+    data_store, linia, camera, save_image=True, preanalysis=PREANALYSIS_ENABLED
+):
+    poller = AdaptivePoller()
+    if preanalysis and isinstance(camera, VisionProcess):
+        # Analiza wstępna potrzebuje bufora klatek kamery w tym samym procesie
+        logger.warning(
+            "Analiza wstępna niedostępna z procesem wizyjnym (VISION_PROCESS)"
+        )
+        preanalysis = False
+    preanalyzer = PreAnalyzer(camera, save_image=save_image) if preanalysis else None
+    try:
+        while True:
+            connected = False
+            try:
+                read_start = time.perf_counter()
+                connected = await linia.read_async()
+                if connected:
+                    metrics.observe("plc_read_ms", elapsed_ms(read_start))
+                # Chwila, w której wiemy już o żądaniu analizy - klatka musi być późniejsza
+                trigger_ts = time.monotonic()
+                if preanalyzer is not None:
+                    preanalyzer.update(connected and data_store.klocek_w_podajniku)
+                if data_store.analyze:
+                    logger.info("Start analizy!")
+                    try:
+                        wizja_result = None
+                        if preanalyzer is not None:
+                            wizja_result = preanalyzer.take(trigger_ts)
+                        if wizja_result is None:
+                            # Analiza w osobnym wątku - pętla zdarzeń obsługuje w tym czasie API
+                            start = time.perf_counter()
+                            if isinstance(camera, VisionProcess):
+                                # Analiza w procesie wizyjnym - tu tylko czekamy na wynik
+                                wizja_result = await camera.analyze(
+                                    trigger_ts=trigger_ts, save_image=save_image
+                                )
+                            else:
+                                wizja_result = await wizja_still_async(
+                                    camera=camera,
+                                    trigger_ts=trigger_ts,
+                                    save_image=save_image,
+                                )
+                            metrics.observe("analysis_ms", elapsed_ms(start))
+                        logger.info(f"Wynik analizy: {wizja_result}")
+                        if _should_detect_red_circle(wizja_result):
+                            logger.info(
+                                "Wykryto czerwone koło, zapisuję wynik jako 1..."
+                            )
+                            data_store.result = 1
+                        else:
+                            logger.info(
+                                "Nie wykryto czerwonego koła, zapisuję wynik jako 0..."
+                            )
+                            data_store.result = 0
+
+                        data_store.error = 0
+                        data_store.finished = 1
+                    except Exception as e:
+                        logger.exception(f"Błąd podczas analizy: {e}")
+                        data_store.error = 1
+
+                    data_store.set_data(analyze=0)
+
+                    await linia.write_async()
+                    logger.info("Analiza zakończona, wynik zapisany.")
+            except Exception as e:
+                logger.exception(str(e))
+
+            # Bez połączenia flagi linii są nieaktualne - odpytuj w trybie bezczynności
+            interval = poller.next_interval(connected and _line_active(data_store))
+            metrics.set("plc_poll_interval_ms", interval * 1000)
+            sleep_start = time.monotonic()
+            await asyncio.sleep(interval)
+            jitter = time.monotonic() - sleep_start - interval
+            metrics.observe("plc_poll_jitter_ms", jitter * 1000)
+    finally:
+        if preanalyzer is not None:
+            preanalyzer.stop()
 
 
 if __name__ == "__main__":
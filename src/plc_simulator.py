@@ -0,0 +1,160 @@
+"""Lokalny symulator sterownika PLC (serwer snap7) z blokiem DB1 linii.
+
+Układ DB1 jest taki sam jak w `plc_connection.LiniaDataStore`. Symulator
+co zadany okres ustawia `analyze`, czeka aż system wizyjny zapisze
+`finished` i mierzy czas od wyzwolenia do wyniku.
+
+Samodzielne uruchomienie:
+    python -m src.plc_simulator --port 1102 --rate 1
+"""
+
+import argparse
+import ctypes
+import itertools
+import logging
+import threading
+import time
+
+from snap7.server import Server
+from snap7.type import SrvArea
+
+from .plc_connection import DB_NUMBER, LiniaDataStore
+
+logger = logging.getLogger("system_wizyjny.plc_simulator")
+
+
+class PLCSimulator:
+    def __init__(self, port=1102, db_number=DB_NUMBER, data_store_cls=LiniaDataStore):
+        self.port = port
+        self.db_number = db_number
+        self._fields = data_store_cls._fields
+        self._db = (ctypes.c_uint8 * data_store_cls.buffer_size())()
+        self._server = Server(log=False)
+        self._server.register_area(SrvArea.DB, db_number, self._db)
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._server.start(tcp_port=self.port)
+        logger.info(f"Symulator PLC nasłuchuje na porcie {self.port}")
+
+    def stop(self):
+        self._server.stop()
+        self._server.destroy()
+
+    # Dostęp do pól DB1 po nazwach z LiniaDataStore. Obszar jest blokowany,
+    # żeby zapis klienta snap7 nie przeplatał się z modyfikacją symulatora.
+
+    def get(self, name):
+        field = self._fields[name]
+        with self._lock:
+            self._server.lock_area(SrvArea.DB, self.db_number)
+            try:
+                return field.read(bytes(self._db), field.default)
+            finally:
+                self._server.unlock_area(SrvArea.DB, self.db_number)
+
+    def set(self, **values):
+        with self._lock:
+            self._server.lock_area(SrvArea.DB, self.db_number)
+            try:
+                buffer = bytearray(self._db)
+                for name, value in values.items():
+                    self._fields[name].write(buffer, value)
+                ctypes.memmove(self._db, bytes(buffer), len(buffer))
+            finally:
+                self._server.unlock_area(SrvArea.DB, self.db_number)
+
+    def trigger(self):
+        """Zgłoś nowy element do analizy. Zwraca chwilę wyzwolenia."""
+        self.set(finished=0, result=0, error=0, analyze=1)
+        return time.perf_counter()
+
+    def wait_finished(self, timeout, poll=0.001):
+        """Czekaj na `finished`. Zwraca chwilę zakończenia albo None."""
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if self.get("finished"):
+                return time.perf_counter()
+            time.sleep(poll)
+        return None
+
+    def run_cycles(
+        self, count, rate=1.0, timeout=5.0, stop_event=None, feed_lead=0.0, **state
+    ):
+        """Wyzwala `count` analiz z częstotliwością `rate` [Hz].
+
+        `feed_lead` > 0 ustawia `klocek_w_podajniku` na tyle sekund przed
+        `analyze` (jak czujnik podajnika na linii) i kasuje je po wyniku.
+        `state` to dodatkowe pola ustawiane przed startem (np. tryb_auto=1).
+        Zwraca listę słowników z czasem wyzwolenie -> wynik (ms) i wynikiem.
+        """
+        return list(
+            self.iter_cycles(count, rate, timeout, stop_event, feed_lead, **state)
+        )
+
+    def iter_cycles(
+        self, count, rate=1.0, timeout=5.0, stop_event=None, feed_lead=0.0, **state
+    ):
+        """Jak `run_cycles`, ale zwraca wynik każdego cyklu od razu;
+        `count` = None wyzwala analizy bez końca."""
+        if state:
+            self.set(**state)
+        period = 1.0 / rate if rate > 0 else 0.0
+        next_start = time.perf_counter()
+        for _ in itertools.repeat(None) if count is None else range(count):
+            if stop_event is not None and stop_event.is_set():
+                break
+            delay = next_start - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_start = time.perf_counter() + period
+            if feed_lead > 0:
+                self.set(klocek_w_podajniku=1)
+                time.sleep(feed_lead)
+            triggered_at = self.trigger()
+            finished_at = self.wait_finished(timeout)
+            if feed_lead > 0:
+                self.set(klocek_w_podajniku=0)
+            if finished_at is None:
+                self.set(analyze=0)
+                yield {"latency_ms": None, "result": None, "error": None}
+                continue
+            yield {
+                "latency_ms": (finished_at - triggered_at) * 1000,
+                "result": self.get("result"),
+                "error": self.get("error"),
+            }
+
+
+def main():
+    p = argparse.ArgumentParser(description="Symulator PLC (snap7) dla linii")
+    p.add_argument("--port", type=int, default=1102, help="port TCP serwera snap7")
+    p.add_argument(
+        "--rate",
+        type=float,
+        default=0.0,
+        help="wyzwalania analizy na sekundę (0 = brak)",
+    )
+    p.add_argument("--timeout", type=float, default=5.0, help="limit czasu analizy (s)")
+    args = p.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    simulator = PLCSimulator(port=args.port)
+    simulator.start()
+    try:
+        if args.rate > 0:
+            # Jeden harmonogram dla wszystkich cykli - odstęp liczony od startu
+            # poprzedniego wyzwolenia, nie od końca analizy
+            for cycle in simulator.iter_cycles(None, args.rate, args.timeout):
+                logger.info(f"Cykl: {cycle}")
+        else:
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
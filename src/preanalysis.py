@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+from .config import PREANALYSIS_STABLE_FRAMES, PREANALYSIS_MAX_AGE, GATE_ENABLED
+from .gating import MotionGate
+from .image_writer import image_writer
+from .metrics import elapsed_ms, metrics
+from .vision_executor import run_in_vision_executor
+from .wizja import find_objects, prepare_frame, verdict_key
+
+logger = logging.getLogger("system_wizyjny")
+
+
+class PreAnalyzer:
+    """Analiza z wyprzedzeniem, gdy element leży już w podajniku.
+
+    Póki `klocek_w_podajniku` jest ustawione, kolejne klatki z bufora kamery
+    są analizowane w tle. Werdykt jest stabilny, gdy ostatnie `stable_frames`
+    detekcji dało ten sam wynik - klatki pominięte przez `MotionGate` (wynik
+    powtórzony) się nie liczą. Po przyjściu `analyze` `take()` zwraca ten
+    werdykt, jeśli ostatnia zgodna klatka nie jest starsza niż `max_age`
+    sekund od wyzwolenia - wtedy detekcja w ogóle nie jest na ścieżce
+    krytycznej. W przeciwnym razie (None) trzeba wykonać zwykłą analizę.
+
+    Po `take()` analizator czeka, aż podajnik się opróżni, żeby wynik
+    poprzedniego elementu nie trafił do następnego.
+    """
+
+    def __init__(
+        self,
+        camera,
+        stable_frames=PREANALYSIS_STABLE_FRAMES,
+        max_age=PREANALYSIS_MAX_AGE,
+        save_image=True,
+        gate=GATE_ENABLED,
+    ):
+        self.camera = camera
+        self.gate = gate
+        self.stable_frames = max(1, stable_frames)
+        self.max_age = max_age
+        self.save_image = save_image
+        self._history = deque(maxlen=self.stable_frames)
+        self._latest = None  # (FrameRef, wynik) ostatniej analizowanej klatki
+        self._task = None
+        self._cancel = None  # threading.Event zadania w wątku wizyjnym
+        self._armed = True
+        self._gate = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def update(self, present):
+        """Wywoływane po każdym odczycie PLC ze stanem `klocek_w_podajniku`."""
+        if not present:
+            self._armed = True
+            self.stop()
+        elif self._armed and not self.running:
+            # Nowy element - bramka uczy się od zera
+            self._gate = MotionGate() if self.gate else None
+            self._cancel = threading.Event()
+            self._task = asyncio.create_task(self._run(self._cancel))
+
+    def _analyze_next(self, after_seq, cancel):
+        # Anulowanie zadania korutyny nie zatrzymuje pracy w wątku wizyjnym -
+        # bez tej flagi zwykła analiza po missie czekałaby w kolejce
+        if cancel.is_set():
+            return None, None, False
+        frame_ref = self.camera.wait_next(after_seq=after_seq)
+        if frame_ref is None:
+            return None, None, False
+        if cancel.is_set():
+            frame_ref.release()
+            return None, None, False
+        start = time.perf_counter()
+        frame = frame_ref.frame
+        prepared = prepare_frame(frame)
+
+        def detect():
+            return find_objects(frame, annotate=False, prepared=prepared)
+
+        if self._gate is None:
+            result, skipped = detect(), None
+        else:
+            # Klatka bez zmian daje ten sam werdykt - bez ponownej detekcji
+            result, skipped = self._gate.run(frame, detect, prepared=prepared)
+        metrics.observe("preanalysis_frame_ms", elapsed_ms(start))
+        if cancel.is_set():
+            # Nikt już nie odbierze wyniku - klatka wraca do bufora od razu
+            frame_ref.release()
+            return None, None, False
+        result = dict(result, frame={"seq": frame_ref.seq})
+        return frame_ref, result, skipped is None
+
+    async def _run(self, cancel):
+        after_seq = None
+        try:
+            while True:
+                frame_ref, result, detected = await run_in_vision_executor(
+                    self._analyze_next, after_seq, cancel
+                )
+                if frame_ref is None:
+                    continue
+                after_seq = frame_ref.seq
+                metrics.inc("preanalysis_frames")
+                # Wynik powtórzony przez bramkę nie potwierdza werdyktu
+                if detected:
+                    self._history.append(verdict_key(result))
+                # Trzymamy tylko ostatnią klatkę (do ewentualnego zapisu)
+                previous, self._latest = self._latest, (frame_ref, result)
+                if previous is not None:
+                    previous[0].release()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.exception(f"Błąd analizy wstępnej: {e}")
+
+    def _stable(self):
+        return len(self._history) == self.stable_frames and (
+            len(set(self._history)) == 1
+        )
+
+    def take(self, trigger_ts):
+        """Werdykt dla wyzwolenia z chwili `trigger_ts` albo None (miss)."""
+        start = time.perf_counter()
+        latest = self._latest
+        verdict = None
+        if latest is not None and self._stable():
+            frame_ref, result = latest
+            age = trigger_ts - frame_ref.timestamp
+            if age <= self.max_age:
+                verdict = dict(result)
+                verdict["frame"] = {
+                    "seq": frame_ref.seq,
+                    "trigger_offset_ms": round(-age * 1000, 1),
+                }
+                verdict["preanalysis"] = {
+                    "frames": self.stable_frames,
+                    "age_ms": round(age * 1000, 1),
+                }
+                if self.save_image:
+                    image_writer.submit(frame_ref.frame, verdict)
+
+        self._armed = False
+        self.stop()
+        if verdict is None:
+            metrics.inc("preanalysis_misses")
+        else:
+            metrics.inc("preanalysis_hits")
+            # Oszczędność szacowana typowym czasem zwykłej analizy (misses)
+            typical = metrics.summary("analysis_ms")["p50"]
+            if typical is not None:
+                metrics.observe("preanalysis_saved_ms", typical - elapsed_ms(start))
+        hits = metrics.get("preanalysis_hits")
+        metrics.set(
+            "preanalysis_hit_rate", hits / (hits + metrics.get("preanalysis_misses"))
+        )
+        return verdict
+
+    def stop(self):
+        if self._cancel is not None:
+            self._cancel.set()
+            self._cancel = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._history.clear()
+        if self._latest is not None:
+            self._latest[0].release()
+            self._latest = None
@@ -0,0 +1,103 @@
+from functools import cached_property
+
+import cv2 as cv
+
+from .config import (
+    FRAME_LEFT_MARGIN,
+    FRAME_TOP_MARGIN,
+    FRAME_RIGHT_MARGIN,
+    FRAME_BOTTOM_MARGIN,
+    DETECTION_PADDING,
+    INSPECTION_ROI,
+)
+
+
+class PreparedFrame:
+    """Klatka wraz z leniwie liczonymi i zapamiętywanymi przekształceniami.
+
+    Konwersje (gray, blur, HSV) wykonywane są co najwyżej raz na klatkę,
+    niezależnie od tego, ile detektorów z nich korzysta.
+
+    Przekształcenia liczone są tylko na oknie detekcji - ramce (roi)
+    poszerzonej o `pad` pikseli i przyciętej do klatki - a nie na całej
+    klatce. Współrzędne w `gray`/`blurred`/`hsv` są względne wobec okna;
+    do współrzędnych klatki przelicza się je przez dodanie `offset`.
+    """
+
+    def __init__(
+        self,
+        frame,
+        left=FRAME_LEFT_MARGIN,
+        top=FRAME_TOP_MARGIN,
+        right=FRAME_RIGHT_MARGIN,
+        bottom=FRAME_BOTTOM_MARGIN,
+        pad=DETECTION_PADDING,
+    ):
+        self.frame = frame
+        frame_h, frame_w = frame.shape[:2]
+        self.left = left
+        self.top = top
+        self.width = frame_w - left - right
+        self.height = frame_h - top - bottom
+        # Okno detekcji (x0, y0, x1, y1)
+        self.window = (
+            max(left - pad, 0),
+            max(top - pad, 0),
+            min(left + self.width + pad, frame_w),
+            min(top + self.height + pad, frame_h),
+        )
+
+    @classmethod
+    def with_roi(cls, frame, left, top, width, height, pad=DETECTION_PADDING):
+        """Tworzy klatkę z ramką podaną jako (x, y, szerokość, wysokość)."""
+        frame_h, frame_w = frame.shape[:2]
+        return cls(
+            frame,
+            left=left,
+            top=top,
+            right=frame_w - left - width,
+            bottom=frame_h - top - height,
+            pad=pad,
+        )
+
+    @property
+    def roi(self):
+        return self.left, self.top, self.width, self.height
+
+    @property
+    def offset(self):
+        return self.window[0], self.window[1]
+
+    @cached_property
+    def window_view(self):
+        x0, y0, x1, y1 = self.window
+        return self.frame[y0:y1, x0:x1]
+
+    @cached_property
+    def roi_view(self):
+        return self.frame[
+            self.top : self.top + self.height, self.left : self.left + self.width
+        ]
+
+    @cached_property
+    def gray(self):
+        return cv.cvtColor(self.window_view, cv.COLOR_BGR2GRAY)
+
+    @cached_property
+    def blurred(self):
+        return cv.medianBlur(self.gray, 5)
+
+    @cached_property
+    def hsv(self):
+        return cv.cvtColor(self.window_view, cv.COLOR_BGR2HSV)
+
+
+def prepare_frame(frame, roi=None):
+    """`roi` (x, y, szerokość, wysokość) zawęża obszar inspekcji; domyślnie
+    `INSPECTION_ROI` z konfiguracji albo ramka z marginesów."""
+    roi = roi or INSPECTION_ROI
+    # Wspólne przetwarzanie wstępne (gray/blur/HSV) liczone raz na klatkę,
+    # tylko na ramce poszerzonej o zapas na koła przy krawędzi
+    if roi:
+        return PreparedFrame.with_roi(frame, *roi)
+    return PreparedFrame(frame)
@@ -0,0 +1,130 @@
+import logging
+import os
+import time
+
+import cv2 as cv
+import numpy as np
+
+from .config import CAMERA_FPS
+
+logger = logging.getLogger("system_wizyjny")
+
+_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class ReplaySource:
+    """Źródło klatek odtwarzające zapisane zdjęcia (katalog) lub plik wideo.
+
+    Pozwala uruchomić całą aplikację i detekcję bez kamery, np.:
+        CAMERA_BACKEND=replay CAMERA_REPLAY_PATH=wizja_zdjecia/raw fastapi dev main.py
+
+    - `fps` - tempo odtwarzania w trybie czasu rzeczywistego,
+    - `loop` - po ostatniej klatce zacznij od początku,
+    - `realtime` - False oznacza odtwarzanie tak szybko, jak się da.
+    """
+
+    def __init__(self, path, fps=CAMERA_FPS, loop=True, realtime=True, size=None):
+        if not path or not os.path.exists(path):
+            raise RuntimeError(f"Brak źródła do odtwarzania: {path}")
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+        self.realtime = realtime
+        self.size = tuple(size) if size else None
+        self.finished = False
+        self._files = None
+        self._first = None  # pierwszy obraz, wczytany już przy starcie
+        self._video = None
+        self._index = 0
+        self._next_time = None
+
+        if os.path.isdir(path):
+            files = []
+            for root, _dirs, filenames in os.walk(path):
+                for name in filenames:
+                    if name.lower().endswith(_IMAGE_EXTENSIONS):
+                        files.append(os.path.join(root, name))
+            files.sort()
+            if not files:
+                raise RuntimeError(f"Brak obrazów w katalogu: {path}")
+            self._files = files
+            # Katalog bez żadnego czytelnego obrazu to błąd już przy starcie
+            self._first = self._next_image()
+        else:
+            self._video = cv.VideoCapture(path)
+            if not self._video.isOpened():
+                raise RuntimeError(f"Nie można otworzyć pliku wideo: {path}")
+
+    @classmethod
+    def from_env(cls, size=None, fps=CAMERA_FPS):
+        return cls(
+            os.getenv("CAMERA_REPLAY_PATH", "wizja_zdjecia/raw"),
+            fps=float(os.getenv("CAMERA_REPLAY_FPS", fps)),
+            loop=_env_flag("CAMERA_REPLAY_LOOP", True),
+            realtime=_env_flag("CAMERA_REPLAY_REALTIME", True),
+            size=size,
+        )
+
+    def _wait_for_slot(self):
+        if not self.realtime or self.fps <= 0:
+            return
+        now = time.monotonic()
+        if self._next_time is None or self._next_time < now - 1.0:
+            # Start lub duże opóźnienie - nie nadrabiaj zaległych klatek
+            self._next_time = now
+        elif self._next_time > now:
+            time.sleep(self._next_time - now)
+        self._next_time += 1.0 / self.fps
+
+    def _next_image(self):
+        if self._files is not None:
+            if self._first is not None:
+                image, self._first = self._first, None
+                return image
+            while self._files:
+                if self._index >= len(self._files):
+                    if not self.loop:
+                        return None
+                    self._index = 0
+                image = cv.imread(self._files[self._index])
+                if image is not None:
+                    self._index += 1
+                    return image
+                # Uszkodzony plik - pomiń go (także w kolejnych okrążeniach)
+                logger.warning(f"Nie można odczytać obrazu: {self._files[self._index]}")
+                del self._files[self._index]
+            raise RuntimeError(
+                f"Żaden obraz w katalogu nie daje się odczytać: {self.path}"
+            )
+        ok, image = self._video.read()
+        if not ok and self.loop:
+            self._video.set(cv.CAP_PROP_POS_FRAMES, 0)
+            ok, image = self._video.read()
+        return image if ok else None
+
+    def read(self, out=None):
+        """Kolejna klatka (BGR) albo None po zakończeniu odtwarzania."""
+        if self.finished:
+            return None
+        self._wait_for_slot()
+        image = self._next_image()
+        if image is None:
+            self.finished = True
+            return None
+        if self.size and (image.shape[1], image.shape[0]) != self.size:
+            image = cv.resize(image, self.size, interpolation=cv.INTER_AREA)
+        if out is not None and out.shape == image.shape:
+            np.copyto(out, image)
+            return out
+        return image
+
+    def release(self):
+        if self._video is not None:
+            self._video.release()
@@ -24,11 +24,13 @@ async def update_data(payload: dict):
     """Update PLC data with incoming values."""
     data_store.set_data(**payload.get("data", {}))
     try:
-        await linia.write()
+        written = await linia.write_batched()
     except Exception as exc:  # noqa: BLE001 - need real exception info
         logger = logging.getLogger("system_wizyjny")
         logger.error("Błąd podczas zapisu do PLC: %s", exc)
         return {"status": "error", "message": str(exc)}
+    if not written:
+        return {"status": "error", "message": "Nie udało się zapisać danych do PLC"}
     return {"status": "success"}
 
 
@@ -45,7 +47,7 @@ async def update_data_stream(websocket: WebSocket):
                 payload = json.loads(message)
                 data_store.set_data(**payload.get("data", {}))
                 try:
-                    await linia.write()
+                    await linia.write_batched()
                 except Exception as exc:  # noqa: BLE001 - need real exception info
                     logger = logging.getLogger("system_wizyjny")
                     logger.error("Błąd podczas zapisu do PLC: %s", exc)
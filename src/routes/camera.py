@@ -15,3 +15,11 @@ async def camera_stream():
         )
     else:
         return
+
+
+@router.get("/camera/stats")
+def camera_stats():
+    """Per-client MJPEG stream statistics (fps, sent and dropped frames)."""
+    if not camera:
+        return {"status": "error", "message": "Camera not available"}
+    return {"status": "success", "data": camera.broadcaster.stats()}
@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+
+from src.metrics import metrics
+from src.state import camera
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def read_metrics():
+    """Runtime metrics: counters, gauges and latency summaries."""
+    data = metrics.snapshot()
+    # With VISION_PROCESS the vision worker reports its own metrics and CPU time
+    worker = getattr(camera, "worker_metrics", None)
+    if worker is not None:
+        data["vision_process"] = worker
+    return {
+        "status": "success",
+        "data": data,
+    }
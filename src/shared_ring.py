@@ -0,0 +1,105 @@
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedFrameRing:
+    """Bufor pierścieniowy klatek w pamięci współdzielonej między procesami.
+
+    Jeden proces zapisuje (`write`), inne czytają kopię najnowszej klatki
+    (`read_latest`). Zamiast blokad każdy slot ma licznik generacji
+    (seqlock): nieparzysty w trakcie zapisu, a czytelnik, który zobaczy inny
+    licznik przed i po kopiowaniu, ponawia odczyt. Zapis nigdy nie trafia do
+    slotu z najnowszą klatką, więc przy >= 3 slotach czytelnik ma co najmniej
+    dwa okresy klatki na skopiowanie.
+
+    Układ bloku: int64 [latest, gen[n], seq[n]], float64 [want, ts[n]],
+    potem n klatek `shape` uint8. `want` to chwila (`time.monotonic()`), do
+    której czytelnik chce dostawać klatki - bez tego zapis jest pomijany.
+    """
+
+    def __init__(self, slots, shape, name=None):
+        if slots < 3:
+            raise ValueError("Bufor klatek musi mieć co najmniej 3 sloty")
+        self.slots = slots
+        self.shape = tuple(shape)
+        ints = 1 + 2 * slots
+        floats = 1 + slots
+        frames_offset = -(-8 * (ints + floats) // 64) * 64
+        frame_bytes = int(np.prod(self.shape))
+        size = frames_offset + slots * frame_bytes
+        self._owner = name is None
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        buf = self._shm.buf
+        self._ints = np.ndarray((ints,), np.int64, buf)
+        self._floats = np.ndarray((floats,), np.float64, buf, offset=8 * ints)
+        self._frames = np.ndarray(
+            (slots,) + self.shape, np.uint8, buf, offset=frames_offset
+        )
+        self._gen = self._ints[1 : 1 + slots]
+        self._seq = self._ints[1 + slots :]
+        self._ts = self._floats[1:]
+        if self._owner:
+            self._ints[:] = 0
+            self._ints[0] = -1
+            self._seq[:] = -1
+            self._floats[:] = 0.0
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    # --- strona zapisu ---
+
+    @property
+    def wanted(self):
+        return time.monotonic() < self._floats[0]
+
+    def write(self, frame, seq, timestamp):
+        latest = int(self._ints[0])
+        slot = (latest + 1) % self.slots
+        self._gen[slot] += 1
+        np.copyto(self._frames[slot], frame)
+        self._seq[slot] = seq
+        self._ts[slot] = timestamp
+        self._gen[slot] += 1
+        self._ints[0] = slot
+
+    # --- strona odczytu ---
+
+    def request(self, duration):
+        """Poproś o klatki przez najbliższe `duration` sekund."""
+        self._floats[0] = time.monotonic() + duration
+
+    def read_latest(self, after_seq=-1, out=None, attempts=3):
+        """Kopia najnowszej klatki: (seq, timestamp, klatka) albo None, gdy nie
+        ma klatki nowszej niż `after_seq` (lub zapis przeszkadzał odczytom)."""
+        for _ in range(attempts):
+            slot = int(self._ints[0])
+            if slot < 0:
+                return None
+            generation = int(self._gen[slot])
+            if generation % 2:
+                continue
+            seq = int(self._seq[slot])
+            if seq <= after_seq:
+                return None
+            timestamp = float(self._ts[slot])
+            if out is None:
+                out = np.empty(self.shape, np.uint8)
+            np.copyto(out, self._frames[slot])
+            if int(self._gen[slot]) == generation:
+                return seq, timestamp, out
+        return None
+
+    def close(self):
+        # Widoki numpy trzeba zwolnić przed zamknięciem bloku pamięci
+        self._ints = self._floats = self._frames = None
+        self._gen = self._seq = self._ts = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
@@ -4,7 +4,9 @@ import logging
 from dotenv import load_dotenv
 
 from src.plc_connection import LiniaConnection, LiniaDataStore
-from src.camera import Camera
+from src.camera import Camera, camera_backend
+from src.config import VISION_PROCESS
+from src.vision_process import VisionProcess
 
 logger = logging.getLogger("system_wizyjny")
 logger.setLevel(logging.DEBUG)
@@ -27,11 +29,12 @@ linia = LiniaConnection(
     port=port,
 )
 
-# Upewnij się, że żadna inna aplikacja nie używa kamery
-os.system("sudo fuser -k /dev/video0")
-
 try:
-    camera = Camera()
+    if camera_backend() != "replay":
+        # Upewnij się, że żadna inna aplikacja nie używa kamery
+        os.system("sudo fuser -k /dev/video0")
+    # Z VISION_PROCESS kamera i analiza działają w osobnym procesie
+    camera = VisionProcess() if VISION_PROCESS else Camera()
 except Exception as e:
     camera = None
     logger.error("Błąd inicjacji kamery")
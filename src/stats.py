@@ -1,13 +1,38 @@
+import atexit
 import os
 import json
+import logging
+import threading
+
+from .config import STATS_FLUSH_INTERVAL
+
+logger = logging.getLogger("system_wizyjny")
 
 
 class Stats:
-    def __init__(self, filename="stats.json"):
+    """Liczniki trzymane w pamięci i zapisywane do pliku JSON w tle.
+
+    `inc` nie wykonuje żadnych operacji dyskowych - zmiany trafiają do pliku
+    przy `flush` (co `STATS_FLUSH_INTERVAL` sekund, przy zamykaniu aplikacji
+    oraz przy wyjściu z procesu).
+    """
+
+    def __init__(self, filename="stats.json", persist=True):
         self.stats_path = os.path.join(
             os.path.dirname(os.path.dirname(__file__)), filename
         )
-        self._load()
+        # persist=False: liczniki tylko w pamięci (proces pomocniczy odsyła
+        # przyrosty do procesu głównego przez `drain`, plik zapisuje tylko on)
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._flush_thread = None
+        self._flush_stop = threading.Event()
+        if persist:
+            self._load()
+        else:
+            self.stats = {}
 
     def _load(self):
         try:
@@ -17,12 +42,82 @@ class Stats:
             self.stats = {}
 
     def save(self):
-        with open(self.stats_path, "w") as f:
-            json.dump(self.stats, f)
+        """Atomowy zapis: plik tymczasowy + rename, żeby nie zostawić uciętego JSON-a."""
+        if not self.persist:
+            return
+        with self._save_lock:
+            with self._lock:
+                snapshot = dict(self.stats)
+                self._dirty = False
+            tmp_path = f"{self.stats_path}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(snapshot, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.stats_path)
+            except Exception:
+                with self._lock:
+                    self._dirty = True
+                raise
+
+    def flush(self):
+        """Zapisz liczniki, jeśli zmieniły się od ostatniego zapisu."""
+        if not self._dirty:
+            return
+        try:
+            self.save()
+        except Exception as e:
+            logger.error(f"Błąd zapisu statystyk: {e}")
 
     def inc(self, key, value=1):
-        self.stats[key] = self.stats.get(key, 0) + value
-        self.save()
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + value
+            self._dirty = True
 
     def get(self, key, default=0):
         return self.stats.get(key, default)
+
+    def drain(self):
+        """Zwraca liczniki zebrane od poprzedniego `drain` i je zeruje."""
+        with self._lock:
+            drained, self.stats = self.stats, {}
+            self._dirty = False
+        return drained
+
+    def start_autoflush(self, interval=STATS_FLUSH_INTERVAL):
+        if self._flush_thread is not None and self._flush_thread.is_alive():
+            return
+        self._flush_stop.clear()
+
+        def _run():
+            while not self._flush_stop.wait(interval):
+                self.flush()
+
+        self._flush_thread = threading.Thread(
+            target=_run, name="stats-flush", daemon=True
+        )
+        self._flush_thread.start()
+
+    def stop_autoflush(self):
+        self._flush_stop.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join(timeout=1)
+            self._flush_thread = None
+        self.flush()
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_stats(filename="stats.json", persist=True) -> Stats:
+    """Zwraca współdzieloną (jedną na proces) instancję `Stats` dla pliku.
+    `persist` ma znaczenie tylko przy pierwszym wywołaniu w procesie."""
+    with _registry_lock:
+        stats = _registry.get(filename)
+        if stats is None:
+            stats = Stats(filename, persist=persist)
+            _registry[filename] = stats
+            atexit.register(stats.flush)
+        return stats
@@ -0,0 +1,122 @@
+"""
+Porównanie klasyfikacji koloru kół: dominanta odcienia ("mode") vs klasyfikacja
+każdego piksela tablicą LUT ("pixels") na zbiorze zapisanych zdjęć.
+
+Koła wykrywane są raz (`detect_circles`), potem dla każdego koła mierzony jest
+czas `get_circle_color_distribution` w obu trybach (najlepszy z --repeat powtórzeń)
+i sprawdzana zgodność kolorów. Przy -v wypisywane są koła, na których tryby
+się różnią, razem z rozkładem klas pikseli.
+
+Użycie:
+    python -m src.tests.color_benchmark --images ../wizja_zdjecia/raw
+
+Opcje:
+  --images, -i   Katalog z obrazami (domyślnie z IMAGES_PATH)
+  --repeat       Powtórzenia pomiaru czasu (domyślnie 5)
+  --verbose, -v  Wypisz koła, na których tryby się różnią
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+import cv2 as cv
+
+_THIS_DIR = os.path.abspath(os.path.dirname(__file__))
+_PROJECT_ROOT = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+from src.circles import (  # noqa: E402
+    detect_circles,
+    get_circle_color_distribution,
+)
+from src.colors import get_color_lut  # noqa: E402
+from src.metrics import percentile  # noqa: E402
+from src.tests.saved_images_test import find_image_files  # noqa: E402
+
+
+def _timed(circle, img, hsv, mode: str, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = get_circle_color_distribution(
+            circle["x"], circle["y"], circle["r"], img, hsv, mode=mode
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Kolor koła: dominanta odcienia vs klasyfikacja pikseli (LUT)"
+    )
+    parser.add_argument(
+        "-i",
+        "--images",
+        default=os.environ.get("IMAGES_PATH"),
+        help="Katalog z obrazami (domyślnie z IMAGES_PATH)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not args.images:
+        parser.error("Podaj --images lub ustaw zmienną środowiskową IMAGES_PATH")
+    files = find_image_files(args.images, (".jpg", ".jpeg", ".png", ".bmp"))
+    if not files:
+        print(f"Brak obrazów w {args.images}")
+        return 1
+
+    start = time.perf_counter()
+    get_color_lut()
+    lut_ms = (time.perf_counter() - start) * 1000
+
+    times = {"mode": [], "pixels": []}
+    agree = 0
+    total = 0
+    for path in files:
+        img = cv.imread(path)
+        if img is None:
+            continue
+        h, w = img.shape[:2]
+        hsv = cv.cvtColor(img, cv.COLOR_BGR2HSV)
+        for circle in detect_circles(img, 0, 0, w, h):
+            total += 1
+            (mode_color, _, _), mode_ms = _timed(circle, img, hsv, "mode", args.repeat)
+            (pixels_color, _, colors), pixels_ms = _timed(
+                circle, img, hsv, "pixels", args.repeat
+            )
+            times["mode"].append(mode_ms)
+            times["pixels"].append(pixels_ms)
+            if mode_color == pixels_color:
+                agree += 1
+            elif args.verbose:
+                print(
+                    f"{os.path.relpath(path, args.images)} "
+                    f"({circle['x']}, {circle['y']}, r={circle['r']}): "
+                    f"mode={mode_color} pixels={pixels_color} {colors}"
+                )
+
+    if not total:
+        print("Brak wykrytych kół")
+        return 1
+    print(f"\nKoła: {total}, wczytanie/zbudowanie LUT: {lut_ms:.1f} ms")
+    print(f"{'':10s}{'p50':>8s}{'p95':>8s}{'max':>8s}  [ms na koło]")
+    for name in ("mode", "pixels"):
+        values = times[name]
+        print(
+            f"{name:10s}{percentile(values, 50):8.3f}{percentile(values, 95):8.3f}"
+            f"{max(values):8.3f}"
+        )
+    print(f"Zgodność kolorów: {agree}/{total}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
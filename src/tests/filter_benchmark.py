@@ -0,0 +1,257 @@
+"""
+Mikrobenchmark filtrowania kandydatów w detektorach kół i konturów.
+
+Na syntetycznych, zagraconych klatkach (wiele okręgów, prostokątów i linii,
+niski `param2`, więc Hough zwraca setki kandydatów) porównuje poprzednie
+pętle w Pythonie z wersjami wektorowymi z `src.circles` / `src.contours`:
+sprawdza, że wyniki są identyczne, i podaje czasy.
+
+Użycie:
+    python -m src.tests.filter_benchmark --frames 20 --clutter 150 --param2 10
+
+Opcje:
+  --frames   Liczba syntetycznych klatek (domyślnie 20)
+  --clutter  Liczba losowych kształtów na klatce (domyślnie 150)
+  --param2   Próg akumulatora HoughCircles (domyślnie 10 - dużo kandydatów)
+  --repeat   Ile razy powtórzyć pomiar (domyślnie 20)
+  --seed     Ziarno generatora (domyślnie 0)
+  --candidates  Liczby losowych kół do testu skalowania (domyślnie 50,200,1000)
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+import cv2 as cv
+import numpy as np
+
+_THIS_DIR = os.path.abspath(os.path.dirname(__file__))
+_PROJECT_ROOT = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+from src.circles import filter_circles  # noqa: E402
+from src.config import CIRCLE_MIN_RADIUS, CIRCLE_MAX_RADIUS  # noqa: E402
+from src.contours import contour_centroids  # noqa: E402
+from src.preprocessing import PreparedFrame  # noqa: E402
+
+
+# --- poprzednie implementacje (referencja) ---
+
+
+def legacy_filter_circles(circles, left, top, width, height):
+    circles = [tuple(map(int, pt)) for pt in circles]
+    circles.sort(key=lambda x: -x[2])
+    filtered = []
+    for a1, b1, r1 in circles:
+        inside = False
+        for a2, b2, r2 in filtered:
+            if (a1 - a2) ** 2 + (b1 - b2) ** 2 < r2**2:
+                inside = True
+                break
+        if not inside and (left <= a1 < left + width and top <= b1 < top + height):
+            filtered.append((a1, b1, r1))
+    return filtered
+
+
+def legacy_contour_filter(kontury, left, top, width, height):
+    result = []
+    for kontur in kontury:
+        M = cv.moments(kontur)
+        if M["m00"] != 0:
+            cx = int(M["m10"] / M["m00"])
+            cy = int(M["m01"] / M["m00"])
+            if left <= cx < left + width and top <= cy < top + height:
+                result.append(kontur)
+    return result
+
+
+def legacy_dedupe(rects):
+    srodki = []
+    for (x, y), (szer, wys), _ in rects:
+        x = int(x)
+        y = int(y)
+        rysuj = 1
+        if szer * wys > 2000:
+            for a, b in srodki:
+                if abs(a - x) < 30 or abs(b - y) < 30:
+                    rysuj = 0
+                    break
+            if rysuj:
+                srodki.append((x, y))
+    return srodki
+
+
+# --- wersje wektorowe (jak w src.contours.detect_contours) ---
+
+
+def vector_contour_filter(kontury, left, top, width, height):
+    cx, cy, valid = contour_centroids(kontury)
+    in_frame = (
+        valid & (left <= cx) & (cx < left + width) & (top <= cy) & (cy < top + height)
+    )
+    return [kontur for kontur, ok in zip(kontury, in_frame) if ok]
+
+
+def vector_dedupe(rects, shape):
+    zajete_x = np.zeros(shape[1], dtype=bool)
+    zajete_y = np.zeros(shape[0], dtype=bool)
+    srodki = []
+    for (x, y), (szer, wys), _ in rects:
+        x = int(x)
+        y = int(y)
+        if szer * wys > 2000 and not (zajete_x[x] or zajete_y[y]):
+            srodki.append((x, y))
+            zajete_x[max(x - 29, 0) : x + 30] = True
+            zajete_y[max(y - 29, 0) : y + 30] = True
+    return srodki
+
+
+def synthetic_frames(count: int, clutter: int, seed: int) -> List[np.ndarray]:
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        frame = np.full((360, 640, 3), rng.integers(40, 200, 3), np.uint8)
+        for _ in range(clutter):
+            color = tuple(int(v) for v in rng.integers(0, 256, 3))
+            kind = rng.integers(0, 3)
+            p1 = tuple(int(v) for v in rng.integers(0, 640, 2))
+            p2 = tuple(int(v) for v in rng.integers(0, 640, 2))
+            if kind == 0:
+                cv.rectangle(frame, p1, p2, color, int(rng.integers(-1, 4)))
+            elif kind == 1:
+                cv.line(frame, p1, p2, color, int(rng.integers(1, 4)))
+            else:
+                radius = int(
+                    rng.integers(CIRCLE_MIN_RADIUS - 10, CIRCLE_MAX_RADIUS + 10)
+                )
+                cv.circle(frame, p1, radius, color, int(rng.integers(-1, 4)))
+        frames.append(cv.GaussianBlur(frame, (5, 5), 1.5))
+    return frames
+
+
+def _timeit(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Mikrobenchmark filtrowania detekcji")
+    parser.add_argument("--frames", type=int, default=20, help="Liczba klatek")
+    parser.add_argument("--clutter", type=int, default=150, help="Kształtów na klatce")
+    parser.add_argument("--param2", type=int, default=10, help="param2 HoughCircles")
+    parser.add_argument("--repeat", type=int, default=20, help="Powtórzenia pomiaru")
+    parser.add_argument("--seed", type=int, default=0, help="Ziarno generatora")
+    parser.add_argument(
+        "--candidates",
+        type=lambda s: [int(v) for v in s.split(",")],
+        default=[50, 200, 1000],
+        help="Liczby losowych kandydatów dla filtra kół (lista po przecinku)",
+    )
+    args = parser.parse_args(argv)
+
+    mismatches = 0
+    totals = {"circles_old": 0.0, "circles_new": 0.0}
+    totals.update({"contours_old": 0.0, "contours_new": 0.0})
+    candidates = []
+    n_contours = []
+    for frame in synthetic_frames(args.frames, args.clutter, args.seed):
+        prepared = PreparedFrame(frame)
+        roi = prepared.roi
+
+        detected = cv.HoughCircles(
+            prepared.blurred,
+            cv.HOUGH_GRADIENT,
+            dp=1,
+            minDist=CIRCLE_MIN_RADIUS * 2,
+            param1=15,
+            param2=args.param2,
+            minRadius=CIRCLE_MIN_RADIUS,
+            maxRadius=CIRCLE_MAX_RADIUS,
+        )
+        circles = (
+            np.uint16(np.around(detected))[0]
+            if detected is not None
+            else np.zeros((0, 3), np.uint16)
+        )
+        candidates.append(len(circles))
+        if legacy_filter_circles(circles, *roi) != filter_circles(circles, *roi):
+            mismatches += 1
+        totals["circles_old"] += _timeit(
+            lambda: legacy_filter_circles(circles, *roi), args.repeat
+        )
+        totals["circles_new"] += _timeit(
+            lambda: filter_circles(circles, *roi), args.repeat
+        )
+
+        krawedzie = cv.Canny(prepared.blurred, 50, 140)
+        kontury, _ = cv.findContours(
+            krawedzie, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE
+        )
+        n_contours.append(len(kontury))
+        old = legacy_contour_filter(kontury, *roi)
+        new = vector_contour_filter(kontury, *roi)
+        rects = [cv.minAreaRect(kontur) for kontur in old]
+        if len(old) != len(new) or any(a is not b for a, b in zip(old, new)):
+            mismatches += 1
+        if legacy_dedupe(rects) != vector_dedupe(rects, krawedzie.shape):
+            mismatches += 1
+        totals["contours_old"] += _timeit(
+            lambda: (legacy_contour_filter(kontury, *roi), legacy_dedupe(rects)),
+            args.repeat,
+        )
+        totals["contours_new"] += _timeit(
+            lambda: (
+                vector_contour_filter(kontury, *roi),
+                vector_dedupe(rects, krawedzie.shape),
+            ),
+            args.repeat,
+        )
+
+    n = max(args.frames, 1)
+    print(
+        f"Klatki: {args.frames}, kandydatów Hougha (średnio): {np.mean(candidates):.0f}"
+    )
+    print(f"Konturów na klatkę (średnio): {np.mean(n_contours):.0f}")
+    for name in ("circles", "contours"):
+        old = totals[f"{name}_old"] / n
+        new = totals[f"{name}_new"] / n
+        speedup = old / new if new > 0 else float("inf")
+        print(
+            f"{name:9s} pętla: {old:7.3f} ms  wektorowo: {new:7.3f} ms  x{speedup:.1f}"
+        )
+
+    # minDist w HoughCircles ogranicza liczbę kandydatów na klatce, więc
+    # skalowanie filtra kół sprawdzamy dodatkowo na losowych zbiorach kół
+    rng = np.random.default_rng(args.seed)
+    roi = PreparedFrame(np.zeros((360, 640, 3), np.uint8)).roi
+    print("\nFiltr kół, losowi kandydaci:")
+    for count in args.candidates:
+        circles = np.stack(
+            [
+                rng.integers(0, 640, count),
+                rng.integers(0, 360, count),
+                rng.integers(CIRCLE_MIN_RADIUS, CIRCLE_MAX_RADIUS + 1, count),
+            ],
+            axis=1,
+        ).astype(np.uint16)
+        if legacy_filter_circles(circles, *roi) != filter_circles(circles, *roi):
+            mismatches += 1
+        old = _timeit(lambda: legacy_filter_circles(circles, *roi), args.repeat)
+        new = _timeit(lambda: filter_circles(circles, *roi), args.repeat)
+        print(
+            f"n={count:5d}    pętla: {old:7.3f} ms  wektorowo: {new:7.3f} ms  x{old / new:.1f}"
+        )
+
+    print(f"\nNiezgodności wyników: {mismatches}")
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,166 @@
+"""
+Benchmark end-to-end: symulator PLC -> monitor_and_analyze -> wynik w DB1.
+
+Symulator (serwer snap7 na localhost) ustawia `analyze` z zadaną
+częstotliwością i mierzy czas do zapisania `finished`/`result` przez
+system wizyjny. Kamera jest zastąpiona odtwarzaniem zapisanych zdjęć.
+
+Użycie:
+    python -m src.tests.plc_benchmark --images ../wizja_zdjecia/raw --count 50 --rate 2
+
+Opcje:
+  --images, -i   Katalog ze zdjęciami lub plik wideo (domyślnie z IMAGES_PATH)
+  --count, -n    Liczba analiz (domyślnie 50)
+  --rate         Wyzwolenia na sekundę (domyślnie 2; 0 = jak najszybciej)
+  --port         Port symulatora snap7 (domyślnie 1102)
+  --timeout      Limit czasu jednej analizy w sekundach (domyślnie 5)
+  --save         Zapisuj zdjęcia z analiz (jak na produkcji)
+  --preanalysis  Włącz analizę wstępną (element w podajniku przed `analyze`)
+  --feed-lead    Ile sekund przed `analyze` element leży w podajniku (domyślnie 0.5)
+  --vision-process  Kamera i analiza w osobnym procesie (VISION_PROCESS)
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+_THIS_DIR = os.path.abspath(os.path.dirname(__file__))
+_PROJECT_ROOT = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:8.1f}"
+
+
+async def _run(args) -> int:
+    from src.camera import Camera
+    from src.metrics import metrics, percentile
+    from src.plc_connection import LiniaConnection, LiniaDataStore, monitor_and_analyze
+    from src.plc_simulator import PLCSimulator
+    from src.vision_process import VisionProcess
+
+    simulator = PLCSimulator(port=args.port)
+    simulator.start()
+    if args.vision_process:
+        camera = VisionProcess(backend="replay")
+    else:
+        camera = Camera(backend="replay")
+    data_store = LiniaDataStore()
+    linia = LiniaConnection(
+        ip_address="127.0.0.1", data_store=data_store, rack=0, slot=1, port=args.port
+    )
+    task = asyncio.create_task(
+        monitor_and_analyze(
+            data_store=data_store,
+            linia=linia,
+            camera=camera,
+            save_image=args.save,
+            preanalysis=args.preanalysis,
+        )
+    )
+    try:
+        # Chwila na połączenie z symulatorem i pierwsze klatki
+        await asyncio.sleep(1.0)
+        metrics.reset()
+        start = time.perf_counter()
+        cycles = await asyncio.to_thread(
+            simulator.run_cycles,
+            args.count,
+            args.rate,
+            args.timeout,
+            feed_lead=args.feed_lead,
+            tryb_auto=1,
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        camera.release()
+        simulator.stop()
+
+    latencies: List[float] = [c["latency_ms"] for c in cycles if c["latency_ms"]]
+    timeouts = sum(1 for c in cycles if c["latency_ms"] is None)
+    errors = sum(1 for c in cycles if c["error"])
+    positives = sum(1 for c in cycles if c["result"])
+
+    print("\n== Wyzwolenie -> wynik (ms) ==")
+    print(f"Cykle:        {len(cycles)} (timeout: {timeouts}, error: {errors})")
+    print(f"Wynik = 1:    {positives}")
+    print(f"p50:          {_fmt(percentile(latencies, 50))}")
+    print(f"p95:          {_fmt(percentile(latencies, 95))}")
+    print(f"p99:          {_fmt(percentile(latencies, 99))}")
+    print(f"max:          {_fmt(max(latencies) if latencies else None)}")
+    print(f"Przepustowość: {len(latencies) / elapsed:.2f} analiz/s")
+
+    hits = metrics.get("preanalysis_hits")
+    misses = metrics.get("preanalysis_misses")
+    if hits or misses:
+        print(f"Analiza wstępna: trafienia {hits}, chybienia {misses}")
+
+    print("\n== Metryki procesu ==")
+    for name, summary in metrics.snapshot()["summaries"].items():
+        print(
+            f"{name:28s} n={summary['count']:5d} p50={_fmt(summary['p50'])} "
+            f"p95={_fmt(summary['p95'])} max={_fmt(summary['max'])}"
+        )
+    return 0 if timeouts == 0 else 1
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark opóźnienia wyzwolenie -> wynik z symulatorem PLC"
+    )
+    parser.add_argument(
+        "-i",
+        "--images",
+        default=os.environ.get("IMAGES_PATH"),
+        help="Katalog ze zdjęciami lub plik wideo (domyślnie z IMAGES_PATH)",
+    )
+    parser.add_argument("-n", "--count", type=int, default=50, help="Liczba analiz")
+    parser.add_argument(
+        "--rate", type=float, default=2.0, help="Wyzwolenia na sekundę (0 = max)"
+    )
+    parser.add_argument("--port", type=int, default=1102, help="Port symulatora")
+    parser.add_argument(
+        "--timeout", type=float, default=5.0, help="Limit czasu analizy (s)"
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="Zapisuj zdjęcia z analiz na dysk"
+    )
+    parser.add_argument(
+        "--preanalysis",
+        action="store_true",
+        help="Analizuj element już w podajniku (przed wyzwoleniem)",
+    )
+    parser.add_argument(
+        "--feed-lead",
+        type=float,
+        default=0.5,
+        help="Czas (s) od pojawienia się elementu w podajniku do `analyze`",
+    )
+    parser.add_argument(
+        "--vision-process",
+        action="store_true",
+        help="Kamera i analiza w osobnym procesie (jak VISION_PROCESS = True)",
+    )
+    args = parser.parse_args(argv)
+
+    if not args.images:
+        parser.error("Podaj --images lub ustaw zmienną środowiskową IMAGES_PATH")
+    os.environ["CAMERA_REPLAY_PATH"] = os.path.abspath(args.images)
+
+    return asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+"""
+Test śledzenia zmian lokalnych w LiniaDataStore (zapis tylko zmienionych bajtów).
+
+Sprawdza, że:
+- pierwszy odczyt obrazu DB1 do nowego magazynu danych przyjmuje wartości
+  z PLC i nie zostawia żadnych pól do zapisu,
+- pole ustawione lokalnie przed odczytem zachowuje wartość lokalną i trafia
+  do zapisu tylko w swoim bajcie,
+- po `mark_written` nie ma już czego zapisywać, a kolejny odczyt przyjmuje
+  wartości z PLC,
+- pole zmienione ponownie w trakcie zapisu nadal czeka na zapis.
+
+Użycie:
+    python -m src.tests.plc_datastore_test
+
+Opcje:
+  --verbose, -v  Wypisz wynik każdego sprawdzenia
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import struct
+import sys
+from typing import List
+
+_THIS_DIR = os.path.abspath(os.path.dirname(__file__))
+_PROJECT_ROOT = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+
+def plc_image(analyze=1, good_count=123, tryb_auto=1) -> bytes:
+    """Obraz DB1 jak z `db_read`: analyze (0.0), good_count (2), tryb_auto (14.1)."""
+    from src.plc_connection import LiniaDataStore
+
+    raw = bytearray(LiniaDataStore.buffer_size())
+    raw[0] = analyze
+    raw[2:4] = struct.pack(">H", good_count)
+    raw[14] = tryb_auto << 1
+    return bytes(raw)
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Test śledzenia zmian lokalnych w LiniaDataStore"
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Wynik każdego sprawdzenia"
+    )
+    args = parser.parse_args(argv)
+
+    from src.plc_connection import LiniaDataStore
+
+    failures = 0
+
+    def check(label, actual, expected):
+        nonlocal failures
+        ok = actual == expected
+        failures += not ok
+        if args.verbose or not ok:
+            status = "OK  " if ok else "FAIL"
+            print(f"{status} {label}: {actual!r} (oczekiwano {expected!r})")
+
+    # Pierwszy odczyt do nowego magazynu - wartości z PLC, nic do zapisu
+    store = LiniaDataStore()
+    store.from_bytes(plc_image())
+    check("analyze po odczycie", store.analyze, 1)
+    check("good_count po odczycie", store.good_count, 123)
+    check("tryb_auto po odczycie", store.tryb_auto, 1)
+    check("pola do zapisu po odczycie", store.dirty_fields(), [])
+    check("zakresy do zapisu po odczycie", store.dirty_ranges(), [])
+
+    # Zmiana lokalna przed odczytem ma pierwszeństwo i jest jedyną do zapisu
+    store = LiniaDataStore()
+    store.set_data(speed=2.5)
+    store.from_bytes(plc_image())
+    check("speed po odczycie", store.speed, 2.5)
+    check("analyze obok zmiany lokalnej", store.analyze, 1)
+    check("pola do zapisu ze zmianą", store.dirty_fields(), ["speed"])
+    ranges = store.dirty_ranges()
+    check("offsety zakresów", [start for start, _data in ranges], [8])
+
+    # Po zapisie nic nie czeka, a PLC znów decyduje o wartościach
+    store.mark_written(ranges)
+    check("pola do zapisu po zapisie", store.dirty_fields(), [])
+    store.from_bytes(plc_image(analyze=0, good_count=124))
+    check("analyze po drugim odczycie", store.analyze, 0)
+    check("good_count po drugim odczycie", store.good_count, 124)
+    check("speed po drugim odczycie", store.speed, 0.0)
+
+    # Wyzerowanie analyze po analizie zapisuje tylko bajt 0
+    store = LiniaDataStore()
+    store.from_bytes(plc_image())
+    store.set_data(analyze=0)
+    ranges = store.dirty_ranges()
+    check("zapis analyze=0", ranges, [(0, b"\x00")])
+
+    # Zmiana w trakcie zapisu (zapis idzie w wątku) nadal czeka na zapis
+    store = LiniaDataStore()
+    store.from_bytes(plc_image())
+    store.set_data(speed=1.0)
+    ranges = store.dirty_ranges()
+    store.set_data(speed=2.0)
+    store.mark_written(ranges)
+    check("speed zmienione w trakcie zapisu", store.dirty_fields(), ["speed"])
+
+    print("OK" if not failures else f"Błędy: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,181 @@
+"""
+Analiza w wątku procesu API vs w osobnym procesie wizyjnym (VISION_PROCESS).
+
+W każdym trybie wykonywane jest --count analiz `wizja_still` jedna po
+drugiej (kamera odtwarza zapisane zdjęcia), a w tym samym czasie pętla
+zdarzeń obsługuje --clients klientów podglądu MJPEG - jak serwer API
+z otwartym panelem. Raportowane są:
+- przepustowość (analiz/s) i czas analizy widziany przez wywołującego,
+- opóźnienie pętli zdarzeń (`event_loop_lag_ms`) - rywalizacja o GIL,
+- wykorzystanie każdego rdzenia (/proc/stat) w czasie pomiaru,
+- czas CPU procesu API i procesu wizyjnego (getrusage).
+
+Użycie:
+    python -m src.tests.process_benchmark --images ../wizja_zdjecia/raw --count 100
+
+Opcje:
+  --images, -i   Katalog ze zdjęciami lub plik wideo (domyślnie z IMAGES_PATH)
+  --count, -n    Liczba analiz w każdym trybie (domyślnie 100)
+  --clients      Liczba klientów podglądu MJPEG (domyślnie 1)
+  --mode         thread, process albo both (domyślnie both)
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+from typing import List
+
+_THIS_DIR = os.path.abspath(os.path.dirname(__file__))
+_PROJECT_ROOT = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+
+def read_cpu_times() -> List[List[int]]:
+    """Liczniki jiffies każdego rdzenia z /proc/stat (wiersze cpuN)."""
+    cores = []
+    with open("/proc/stat") as f:
+        for line in f:
+            if line.startswith("cpu") and line[3].isdigit():
+                cores.append([int(v) for v in line.split()[1:]])
+    return cores
+
+
+def core_utilization(before, after) -> List[float]:
+    """Odsetek czasu (0..1), w którym rdzeń nie był bezczynny (idle + iowait)."""
+    result = []
+    for start, end in zip(before, after):
+        deltas = [e - s for s, e in zip(start, end)]
+        total = sum(deltas)
+        idle = deltas[3] + (deltas[4] if len(deltas) > 4 else 0)
+        result.append((total - idle) / total if total else 0.0)
+    return result
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:8.1f}"
+
+
+async def _preview_client(camera, stop):
+    async for _chunk in camera.mjpeg_generator():
+        if stop.is_set():
+            break
+
+
+async def _run_mode(mode: str, args):
+    from src.camera import Camera
+    from src.metrics import metrics, monitor_event_loop_lag, percentile
+    from src.vision_process import VisionProcess
+    from src.wizja import wizja_still_async
+
+    if mode == "process":
+        camera = VisionProcess(backend="replay")
+        analyze = camera.analyze
+    else:
+        camera = Camera(backend="replay")
+
+        async def analyze(**kwargs):
+            return await wizja_still_async(camera=camera, **kwargs)
+
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(monitor_event_loop_lag(stop))]
+    tasks += [
+        asyncio.create_task(_preview_client(camera, stop)) for _ in range(args.clients)
+    ]
+    try:
+        # Rozgrzewka: start kamery, importy, pierwsze klatki podglądu
+        await analyze(save_image=False)
+        await asyncio.sleep(0.5)
+        metrics.reset()
+        worker_start = camera.worker_metrics if mode == "process" else None
+        cpu_start = _cpu_seconds()
+        cores_start = read_cpu_times()
+        start = time.perf_counter()
+        latencies = []
+        for _ in range(args.count):
+            call_start = time.perf_counter()
+            await analyze(save_image=False)
+            latencies.append((time.perf_counter() - call_start) * 1000)
+        elapsed = time.perf_counter() - start
+        cores = core_utilization(cores_start, read_cpu_times())
+        api_cpu = _cpu_seconds() - cpu_start
+        worker_cpu = None
+        if mode == "process":
+            end = camera.worker_metrics
+            worker_cpu = (end["cpu_user_s"] + end["cpu_system_s"]) - (
+                worker_start["cpu_user_s"] + worker_start["cpu_system_s"]
+            )
+    finally:
+        stop.set()
+        camera.broadcaster.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        camera.release()
+
+    lag = metrics.summary("event_loop_lag_ms")
+    print(f"\n== {mode} ==")
+    print(f"Analizy:        {args.count} w {elapsed:.1f} s")
+    print(f"Przepustowość:  {args.count / elapsed:.2f} analiz/s")
+    print(
+        f"Czas analizy:   p50={_fmt(percentile(latencies, 50))} "
+        f"p95={_fmt(percentile(latencies, 95))} ms"
+    )
+    print(
+        f"Lag pętli:      p50={_fmt(lag['p50'])} p95={_fmt(lag['p95'])} "
+        f"max={_fmt(lag['max'])} ms"
+    )
+    print(f"Klatki podglądu: {metrics.get('mjpeg_sent')}")
+    print("Rdzenie:        " + " ".join(f"{u:4.0%}" for u in cores))
+    line = f"CPU procesu API: {api_cpu:.2f} s"
+    if worker_cpu is not None:
+        line += f", procesu wizyjnego: {worker_cpu:.2f} s"
+    print(line)
+
+
+async def _run(args) -> int:
+    modes = ["thread", "process"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        await _run_mode(mode, args)
+    return 0
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Analiza w wątku procesu API vs w osobnym procesie wizyjnym"
+    )
+    parser.add_argument(
+        "-i",
+        "--images",
+        default=os.environ.get("IMAGES_PATH"),
+        help="Katalog ze zdjęciami lub plik wideo (domyślnie z IMAGES_PATH)",
+    )
+    parser.add_argument("-n", "--count", type=int, default=100, help="Liczba analiz")
+    parser.add_argument(
+        "--clients", type=int, default=1, help="Liczba klientów podglądu MJPEG"
+    )
+    parser.add_argument(
+        "--mode", choices=("thread", "process", "both"), default="both", help="Tryb"
+    )
+    args = parser.parse_args(argv)
+
+    if not args.images:
+        parser.error("Podaj --images lub ustaw zmienną środowiskową IMAGES_PATH")
+    # Proces wizyjny dziedziczy środowisko - też odtwarza te zdjęcia
+    os.environ["CAMERA_REPLAY_PATH"] = os.path.abspath(args.images)
+
+    return asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
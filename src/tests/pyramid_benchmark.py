@@ -0,0 +1,162 @@
+"""
+Porównanie trybu jednoetapowego i dwuetapowego (piramida) `detect_circles`
+na zbiorze zapisanych zdjęć: czas detekcji i zgodność wyników.
+
+Dla każdego obrazu liczone są:
+- czas detekcji w obu trybach (najlepszy z --repeat powtórzeń),
+- kryterium poprawności jak w saved_images_test (dokładnie 1 koło),
+- zgodność z trybem jednoetapowym: ta sama liczba kół, środki bliżej niż
+  --tol pikseli, promienie różne o najwyżej --tol i ten sam kolor.
+
+Użycie:
+    python -m src.tests.pyramid_benchmark --images ../wizja_zdjecia/raw
+
+Opcje:
+  --images, -i     Katalog z obrazami (domyślnie z IMAGES_PATH)
+  --levels         Liczba poziomów pyrDown (domyślnie z config)
+  --coarse-param2  Próg akumulatora na pomniejszonym obrazie (domyślnie z config)
+  --margin         Zakres doprecyzowania promienia +/- px (domyślnie z config)
+  --repeat         Powtórzenia pomiaru czasu (domyślnie 3)
+  --tol            Tolerancja położenia/promienia w px (domyślnie 3)
+  --verbose, -v    Wypisz obrazy, na których tryby się różnią
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+import cv2 as cv
+
+_THIS_DIR = os.path.abspath(os.path.dirname(__file__))
+_PROJECT_ROOT = os.path.abspath(os.path.join(_THIS_DIR, "..", ".."))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+from src.circles import detect_circles  # noqa: E402
+from src.config import (  # noqa: E402
+    CIRCLE_PYRAMID_LEVELS,
+    CIRCLE_PYRAMID_PARAM2,
+    CIRCLE_REFINE_MARGIN,
+)
+from src.metrics import percentile  # noqa: E402
+from src.tests.saved_images_test import find_image_files  # noqa: E402
+
+
+def _timed(img, params, repeat: int):
+    h, w = img.shape[:2]
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        circles = detect_circles(img, 0, 0, w, h, params=params)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return circles, best
+
+
+def _matches(reference, candidate, tol: int) -> bool:
+    if len(reference) != len(candidate):
+        return False
+    remaining = list(candidate)
+    for ref in reference:
+        for cand in remaining:
+            if (
+                abs(ref["x"] - cand["x"]) <= tol
+                and abs(ref["y"] - cand["y"]) <= tol
+                and abs(ref["r"] - cand["r"]) <= tol
+                and ref["color"] == cand["color"]
+            ):
+                remaining.remove(cand)
+                break
+        else:
+            return False
+    return True
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:7.2f}"
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Detekcja kół: tryb jednoetapowy vs piramida"
+    )
+    parser.add_argument(
+        "-i",
+        "--images",
+        default=os.environ.get("IMAGES_PATH"),
+        help="Katalog z obrazami (domyślnie z IMAGES_PATH)",
+    )
+    parser.add_argument("--levels", type=int, default=CIRCLE_PYRAMID_LEVELS)
+    parser.add_argument("--coarse-param2", type=int, default=CIRCLE_PYRAMID_PARAM2)
+    parser.add_argument("--margin", type=int, default=CIRCLE_REFINE_MARGIN)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tol", type=int, default=3)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not args.images:
+        parser.error("Podaj --images lub ustaw zmienną środowiskową IMAGES_PATH")
+    files = find_image_files(args.images, (".jpg", ".jpeg", ".png", ".bmp"))
+    if not files:
+        print(f"Brak obrazów w {args.images}")
+        return 1
+
+    single_params = {"pyramid": False}
+    pyramid_params = {
+        "pyramid": True,
+        "pyramid_levels": args.levels,
+        "coarse_param2": args.coarse_param2,
+        "refine_margin": args.margin,
+    }
+    times = {"single": [], "pyramid": []}
+    ok = {"single": 0, "pyramid": 0}
+    agree = 0
+    total = 0
+    for path in files:
+        img = cv.imread(path)
+        if img is None:
+            continue
+        total += 1
+        single, single_ms = _timed(img, single_params, args.repeat)
+        pyramid, pyramid_ms = _timed(img, pyramid_params, args.repeat)
+        times["single"].append(single_ms)
+        times["pyramid"].append(pyramid_ms)
+        ok["single"] += len(single) == 1
+        ok["pyramid"] += len(pyramid) == 1
+        if _matches(single, pyramid, args.tol):
+            agree += 1
+        elif args.verbose:
+            describe = lambda circles: [  # noqa: E731
+                (c["x"], c["y"], c["r"], c["color"]) for c in circles
+            ]
+            print(f"{os.path.relpath(path, args.images)}:")
+            print(f"   jednoetapowo: {describe(single)}")
+            print(f"   piramida:     {describe(pyramid)}")
+
+    if not total:
+        print("Brak czytelnych obrazów")
+        return 1
+    print(f"\nObrazy: {total}")
+    print(
+        f"Piramida: levels={args.levels}, coarse_param2={args.coarse_param2}, "
+        f"margin={args.margin}"
+    )
+    print(f"{'':14s}{'p50':>8s}{'p95':>8s}{'max':>8s}   OK (1 koło)")
+    for name in ("single", "pyramid"):
+        values = times[name]
+        print(
+            f"{name:14s}{_fmt(percentile(values, 50))} {_fmt(percentile(values, 95))} "
+            f"{_fmt(max(values))}   {ok[name]}/{total}"
+        )
+    speedup = percentile(times["single"], 50) / percentile(times["pyramid"], 50)
+    print(f"Przyspieszenie (p50): x{speedup:.2f}")
+    print(f"Zgodność z trybem jednoetapowym (tol={args.tol}px): {agree}/{total}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
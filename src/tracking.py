@@ -0,0 +1,204 @@
+import itertools
+import time
+from collections import Counter
+
+from .circles import detect_circles
+from .config import (
+    CIRCLE_MIN_RADIUS,
+    TRACK_FULL_SEARCH_EVERY,
+    TRACK_WINDOW_MARGIN,
+    TRACK_MAX_MISSES,
+    TRACK_CONFIRM_HITS,
+    TRACK_SMOOTHING,
+)
+from .metrics import metrics
+from .preprocessing import PreparedFrame
+
+
+class Track:
+    """Jedno koło śledzone między klatkami (model stałej prędkości)."""
+
+    def __init__(self, track_id, circle, timestamp):
+        self.id = track_id
+        self.x = float(circle["x"])
+        self.y = float(circle["y"])
+        self.r = circle["r"]
+        self.vx = 0.0  # px/s
+        self.vy = 0.0
+        self.timestamp = timestamp
+        self.hits = 1
+        self.misses = 0
+        self.colors = Counter([circle["color"]])
+        self.circle = circle
+
+    def predict(self, timestamp):
+        dt = timestamp - self.timestamp
+        return self.x + self.vx * dt, self.y + self.vy * dt
+
+    def update(self, circle, timestamp, smoothing):
+        """Filtr alfa-beta: położenie z pomiaru, prędkość wygładzana."""
+        dt = timestamp - self.timestamp
+        if dt > 0:
+            vx = (circle["x"] - self.x) / dt
+            vy = (circle["y"] - self.y) / dt
+            self.vx += smoothing * (vx - self.vx)
+            self.vy += smoothing * (vy - self.vy)
+        self.x = float(circle["x"])
+        self.y = float(circle["y"])
+        self.r = circle["r"]
+        self.timestamp = timestamp
+        self.hits += 1
+        self.misses = 0
+        self.colors[circle["color"]] += 1
+        self.circle = circle
+
+    @property
+    def color(self):
+        # Klasyfikacja całego śladu, a nie pojedynczej klatki
+        return self.colors.most_common(1)[0][0]
+
+    def as_dict(self):
+        return dict(self.circle, id=self.id, color=self.color, hits=self.hits)
+
+
+class CircleTracker:
+    """Śledzenie kół na kolejnych klatkach ze stałymi identyfikatorami.
+
+    Dla znanych śladów koła szukane są tylko w małych oknach wokół położenia
+    przewidzianego ze stałej prędkości (`detect_circles` na oknie ROI).
+    Pełne przeszukanie ramki odbywa się co `full_search_every` klatek, gdy
+    nie ma żadnych śladów albo gdy któryś ślad zaginął - wtedy pojawiają się
+    nowe elementy. Ślad jest usuwany po `max_misses` klatkach bez pomiaru,
+    a liczony jako nowy element (`parts`) po `confirm_hits` trafieniach.
+    """
+
+    def __init__(
+        self,
+        full_search_every=TRACK_FULL_SEARCH_EVERY,
+        window_margin=TRACK_WINDOW_MARGIN,
+        max_misses=TRACK_MAX_MISSES,
+        confirm_hits=TRACK_CONFIRM_HITS,
+        smoothing=TRACK_SMOOTHING,
+        params={},
+    ):
+        self.full_search_every = max(1, full_search_every)
+        self.window_margin = window_margin
+        self.max_misses = max_misses
+        self.confirm_hits = confirm_hits
+        self.smoothing = smoothing
+        self.params = params
+        self.tracks = []
+        self.parts = 0  # liczba potwierdzonych (różnych) elementów
+        self._ids = itertools.count(1)
+        self._frames_since_full = None
+        self._lost = False
+
+    def _window_search(self, frame, prepared, predictions, found=()):
+        left, top, width, height = prepared.roi
+        margin = self.window_margin
+        found = list(found)
+        for px, py in predictions:
+            x0 = max(int(px) - margin, left)
+            y0 = max(int(py) - margin, top)
+            x1 = min(int(px) + margin, left + width)
+            y1 = min(int(py) + margin, top + height)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            window = PreparedFrame.with_roi(frame, x0, y0, x1 - x0, y1 - y0)
+            for circle in detect_circles(
+                frame, *window.roi, params=self.params, prepared=window
+            ):
+                # Sąsiednie okna mogą znaleźć to samo koło
+                if all(
+                    (circle["x"] - c["x"]) ** 2 + (circle["y"] - c["y"]) ** 2
+                    >= CIRCLE_MIN_RADIUS**2
+                    for c in found
+                ):
+                    found.append(circle)
+        return found
+
+    def update(self, frame, timestamp=None, prepared=None):
+        """Śledzi koła na nowej klatce. Zwraca listę kół (jak `detect_circles`)
+        uzupełnionych o `id` i `hits`; kolor to najczęstszy kolor śladu."""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if prepared is None:
+            prepared = PreparedFrame(frame)
+        predictions = [track.predict(timestamp) for track in self.tracks]
+
+        full = (
+            not self.tracks
+            or self._lost
+            or self._frames_since_full is None
+            or self._frames_since_full + 1 >= self.full_search_every
+        )
+        max_dist2 = self.window_margin**2
+        if full:
+            detections = detect_circles(
+                frame, *prepared.roi, params=self.params, prepared=prepared
+            )
+            # Ślady, których pełne przeszukanie nie potwierdziło (np. minDist
+            # Hougha przy dwóch bliskich kołach), sprawdzamy jeszcze w oknach
+            missing = [
+                (px, py)
+                for px, py in predictions
+                if all(
+                    (px - d["x"]) ** 2 + (py - d["y"]) ** 2 > max_dist2
+                    for d in detections
+                )
+            ]
+            if missing:
+                detections = self._window_search(
+                    frame, prepared, missing, found=detections
+                )
+            self._frames_since_full = 0
+            self._lost = False
+            metrics.inc("tracker_full_searches")
+        else:
+            detections = self._window_search(frame, prepared, predictions)
+            self._frames_since_full += 1
+            metrics.inc("tracker_window_searches")
+
+        # Przypisanie pomiarów do śladów: zachłannie od najbliższych par
+        pairs = sorted(
+            (
+                (px - d["x"]) ** 2 + (py - d["y"]) ** 2,
+                t,
+                i,
+            )
+            for t, (px, py) in enumerate(predictions)
+            for i, d in enumerate(detections)
+        )
+        matched_tracks, matched_detections = set(), set()
+        for dist2, t, i in pairs:
+            if dist2 > max_dist2:
+                break
+            if t in matched_tracks or i in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(i)
+            track = self.tracks[t]
+            track.update(detections[i], timestamp, self.smoothing)
+            if track.hits == self.confirm_hits:
+                self.parts += 1
+                metrics.inc("tracker_parts")
+
+        alive = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                # Element uciekł z okna - w następnej klatce szukamy w całej ramce
+                self._lost = True
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            alive.append(track)
+        for i, detection in enumerate(detections):
+            if i not in matched_detections:
+                alive.append(Track(next(self._ids), detection, timestamp))
+                if self.confirm_hits <= 1:
+                    self.parts += 1
+                    metrics.inc("tracker_parts")
+        self.tracks = alive
+        metrics.set("tracker_tracks", len(self.tracks))
+
+        return [track.as_dict() for track in self.tracks if track.misses == 0]
@@ -0,0 +1,28 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Jeden wątek roboczy: analizy obrazu wykonywane są po kolei, a pętla zdarzeń
+# FastAPI (WebSockety, strumień MJPEG, odpytywanie PLC) nie jest blokowana.
+_executor = None
+
+
+def get_vision_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wizja")
+    return _executor
+
+
+async def run_in_vision_executor(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_vision_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def shutdown_vision_executor(wait=True):
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=True)
+        _executor = None
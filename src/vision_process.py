@@ -0,0 +1,305 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import queue
+import resource
+import threading
+import time
+from concurrent.futures import Future
+
+from .config import (
+    CAMERA_ANALYSIS_SIZE,
+    CAMERA_PREVIEW_SIZE,
+    CAMERA_FPS,
+    VISION_PROCESS_SLOTS,
+    VISION_PROCESS_PREVIEW_HOLD,
+    VISION_PROCESS_START_TIMEOUT,
+    VISION_PROCESS_ANALYZE_TIMEOUT,
+)
+from .camera import encode_preview
+from .metrics import elapsed_ms, metrics
+from .mjpeg import MjpegBroadcaster
+from .shared_ring import SharedFrameRing
+from .stats import get_stats
+
+logger = logging.getLogger("system_wizyjny")
+
+
+def _cpu_usage():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        "cpu_user_s": round(usage.ru_utime, 3),
+        "cpu_system_s": round(usage.ru_stime, 3),
+        "max_rss_kb": usage.ru_maxrss,
+    }
+
+
+def _publish_frames(camera, ring, stop):
+    """Wątek procesu wizyjnego: klatki do pamięci współdzielonej, tylko gdy
+    proces API o nie prosi (ktoś ogląda podgląd)."""
+    seq = None
+    while not stop.is_set():
+        if not ring.wanted:
+            stop.wait(0.05)
+            continue
+        try:
+            ref = camera.wait_next(after_seq=seq, timeout=0.5)
+        except RuntimeError:
+            break  # kamera zamknięta
+        if ref is None:
+            continue
+        with ref:
+            ring.write(ref.frame, ref.seq, ref.timestamp)
+            seq = ref.seq
+
+
+def _worker_main(ring_name, slots, size, backend, requests, results):
+    """Proces wizyjny: kamera, analiza (`wizja_still`) i zapis zdjęć.
+
+    Żądania (id, kwargs) przychodzą kolejką `requests` (None kończy pracę),
+    odpowiedzi idą kolejką `results`: (id, wynik, błąd, czas analizy ms,
+    przyrosty liczników `Stats`, metryki procesu).
+    """
+    # Liczniki tylko w pamięci - do stats.json zapisuje proces API
+    stats = get_stats(persist=False)
+
+    from .camera import Camera
+    from .image_writer import image_writer
+    from .wizja import wizja_still
+
+    camera = Camera(size=size, backend=backend)
+    ring = SharedFrameRing(slots, (size[1], size[0], 3), name=ring_name)
+    stop = threading.Event()
+    publisher = threading.Thread(
+        target=_publish_frames, args=(camera, ring, stop), daemon=True
+    )
+    publisher.start()
+    results.put(("ready", None, None, None, {}, {}))
+    try:
+        while True:
+            message = requests.get()
+            if message is None:
+                break
+            request_id, kwargs = message
+            start = time.perf_counter()
+            result, error = None, None
+            try:
+                result = wizja_still(camera=camera, **kwargs)
+            except Exception as e:
+                logger.exception(f"Błąd analizy w procesie wizyjnym: {e}")
+                error = f"{type(e).__name__}: {e}"
+            worker = {"metrics": metrics.snapshot(), **_cpu_usage()}
+            results.put(
+                (request_id, result, error, elapsed_ms(start), stats.drain(), worker)
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        publisher.join(timeout=1)
+        camera.release()
+        image_writer.stop()
+        ring.close()
+
+
+class VisionProcess:
+    """Kamera i analiza obrazu w osobnym procesie (opcja `VISION_PROCESS`).
+
+    Proces API (HTTP/WebSocket, PLC) nie dzieli już GIL-a z wątkiem kamery
+    i detekcją. Analizy zlecane są przez `analyze` (kolejka żądań), wyniki
+    wracają kolejką odpowiedzi i są przekazywane do czekających korutyn przez
+    wątek nasłuchujący. Klatki do podglądu MJPEG przechodzą przez
+    `SharedFrameRing` - proces wizyjny kopiuje je tylko wtedy, gdy ktoś
+    ogląda podgląd; JPEG kodowany jest tutaj, jak w `Camera`.
+
+    Ostatnie metryki procesu wizyjnego (w tym czas CPU z `getrusage`) są
+    w `worker_metrics`, a jego liczniki `Stats` są dodawane do liczników
+    procesu API.
+    """
+
+    def __init__(
+        self,
+        size=CAMERA_ANALYSIS_SIZE,
+        preview_size=CAMERA_PREVIEW_SIZE,
+        fps=CAMERA_FPS,
+        backend=None,
+        slots=VISION_PROCESS_SLOTS,
+        start_timeout=VISION_PROCESS_START_TIMEOUT,
+        analyze_timeout=VISION_PROCESS_ANALYZE_TIMEOUT,
+    ):
+        self.size = tuple(size)
+        self.preview_size = tuple(preview_size)
+        self.fps = fps
+        self.boundary = b"frame"
+        self.broadcaster = MjpegBroadcaster(self.boundary)
+        self.analyze_timeout = analyze_timeout
+        self.worker_metrics = None
+        self.running = True
+        self._released = False
+        self._pending = {}  # id żądania -> (Future, chwila wysłania)
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+        # spawn: proces wizyjny nie dziedziczy wątków ani stanu kamery po rodzicu
+        context = multiprocessing.get_context("spawn")
+        self.ring = SharedFrameRing(slots, (self.size[1], self.size[0], 3))
+        self._requests = context.Queue()
+        self._results = context.Queue()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(
+                self.ring.name,
+                slots,
+                self.size,
+                backend,
+                self._requests,
+                self._results,
+            ),
+            name="wizja-worker",
+            daemon=True,
+        )
+        self.process.start()
+        ready = None
+        deadline = time.monotonic() + start_timeout
+        while ready is None and self.process.is_alive():
+            if time.monotonic() > deadline:
+                break
+            try:
+                ready = self._results.get(timeout=0.5)
+            except queue.Empty:
+                pass
+        if ready is None or ready[0] != "ready":
+            self._shutdown()
+            raise RuntimeError("Proces wizyjny nie wystartował")
+
+        self._listener = threading.Thread(
+            target=self._listen, name="wizja-results", daemon=True
+        )
+        self._listener.start()
+        self._preview_thread = threading.Thread(
+            target=self._preview, name="wizja-preview", daemon=True
+        )
+        self._preview_thread.start()
+
+    # --- analiza ---
+
+    def submit(self, **kwargs):
+        """Zleć `wizja_still(**kwargs)` procesowi wizyjnemu. Zwraca `Future`."""
+        if self._released:
+            raise RuntimeError("Vision process has been released")
+        # Bez procesu albo wątku nasłuchującego nikt nie rozwiąże `Future`
+        if not self.process.is_alive() or not self._listener.is_alive():
+            raise RuntimeError("Proces wizyjny nie działa")
+        future = Future()
+        # Stan RUNNING: timeout w `analyze` nie anuluje go, więc wątek
+        # nasłuchujący zawsze może ustawić wynik
+        future.set_running_or_notify_cancel()
+        request_id = next(self._ids)
+        with self._pending_lock:
+            self._pending[request_id] = (future, time.perf_counter())
+        self._requests.put((request_id, kwargs))
+        return future
+
+    async def analyze(self, timeout=None, **kwargs):
+        """Odpowiednik `wizja_still_async` - analiza w procesie wizyjnym.
+        Bez wyniku po `timeout` sekundach (domyślnie `analyze_timeout`)
+        zgłasza `TimeoutError`."""
+        if timeout is None:
+            timeout = self.analyze_timeout
+        future = self.submit(**kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            metrics.inc("vision_process_timeouts")
+            raise TimeoutError(f"Brak wyniku z procesu wizyjnego po {timeout} s")
+
+    def _listen(self):
+        stats = get_stats()
+        while True:
+            try:
+                message = self._results.get(timeout=0.5)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    if self.running:
+                        logger.error("Proces wizyjny zakończył działanie")
+                    self._fail_pending("Proces wizyjny zakończył działanie")
+                    return
+                continue
+            except (EOFError, OSError):
+                return
+            request_id, result, error, worker_ms, stats_delta, worker = message
+            for key, value in stats_delta.items():
+                stats.inc(key, value)
+            self.worker_metrics = worker
+            with self._pending_lock:
+                future, sent = self._pending.pop(request_id, (None, None))
+            if future is None:
+                continue
+            # Narzut IPC: czas od zlecenia do odpowiedzi poza samą analizą
+            metrics.observe("vision_process_ipc_ms", elapsed_ms(sent) - worker_ms)
+            metrics.inc("vision_process_analyses")
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
+
+    def _fail_pending(self, reason):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future, _sent in pending.values():
+            future.set_exception(RuntimeError(reason))
+
+    # --- podgląd ---
+
+    def _preview(self):
+        seq = -1
+        buffer = None
+        while self.running:
+            if not self.broadcaster.has_subscribers:
+                time.sleep(0.05)
+                continue
+            self.ring.request(VISION_PROCESS_PREVIEW_HOLD)
+            item = self.ring.read_latest(after_seq=seq, out=buffer)
+            if item is None:
+                time.sleep(0.5 / self.fps)
+                continue
+            seq, _timestamp, buffer = item
+            jpeg = encode_preview(buffer, self.preview_size)
+            if jpeg is not None:
+                metrics.inc("camera_jpeg_encoded")
+                self.broadcaster.publish(jpeg)
+
+    def mjpeg_generator(self):
+        """Strumień multipart dla jednego klienta /camera."""
+        return self.broadcaster.stream()
+
+    # --- zamykanie ---
+
+    def _shutdown(self):
+        self.running = False
+        try:
+            self._requests.put(None)
+        except (ValueError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        self.ring.close()
+
+    def release(self):
+        print("Releasing vision process...")
+        if self._released:
+            return
+        self._released = True
+        self.running = False
+        self.broadcaster.close()
+        # Podgląd czyta pamięć współdzieloną - musi skończyć przed jej zamknięciem
+        self._preview_thread.join(timeout=1)
+        self._shutdown()
+        self._fail_pending("Proces wizyjny zamknięty")
+        self._listener.join(timeout=1)
+
+    def stop(self):
+        self.release()
@@ -1,54 +1,134 @@
 import asyncio
-import os
 import cv2 as cv
-import datetime
-import json
 import logging
+from collections import Counter
 
 logger = logging.getLogger("system_wizyjny")
 logger.setLevel(logging.DEBUG)
 
 
-from .stats import Stats
-from .contours import detect_contours
-from .circles import detect_circles
-from .annotations import annotate_frame
+from .stats import get_stats
+from .annotations import annotate_frame, put_text_with_shadow
 from .config import (
-    FRAME_LEFT_MARGIN,
-    FRAME_TOP_MARGIN,
-    FRAME_RIGHT_MARGIN,
-    FRAME_BOTTOM_MARGIN,
     STILL_REPETITION_LIMIT,
+    ANALYSIS_SETTLE_DELAY,
+    STILL_VOTING_FRAMES,
+    STILL_VOTING_AGREE,
+    GATE_ENABLED,
 )
+from .metrics import metrics
+from .pipeline import FrameContext, enabled_stages, vision_pipeline
+from .preprocessing import prepare_frame
 from .camera import Camera
+from .gating import MotionGate
+from .tracking import CircleTracker
+from .vision_executor import run_in_vision_executor
 
 
-def save_image_with_metadata(frame, result):
-    save_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "wizja_zdjecia")
-    save_dir_ann = os.path.join(save_dir, "annotated")
-    save_dir_metadata = os.path.join(save_dir, "metadata")
-    save_dir_raw = os.path.join(save_dir, "raw")
+def verdict_key(result):
+    """Klucz porównywania wyników: liczba kół i ich kolory."""
+    return tuple(circle["color"] for circle in result.get("circles", []))
 
-    os.makedirs(save_dir_raw, exist_ok=True)
-    os.makedirs(save_dir_ann, exist_ok=True)
-    os.makedirs(save_dir_metadata, exist_ok=True)
 
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+def _first_frame(camera, trigger_ts, settle_delay):
+    if trigger_ts is not None:
+        return camera.first_after(trigger_ts + settle_delay)
+    return camera.latest() or camera.wait_next()
 
-    filepath_plain = os.path.join(save_dir_raw, f"wizja_{timestamp}.jpg")
-    filepath_ann = os.path.join(save_dir_ann, f"wizja_{timestamp}_ann.jpg")
-    filepath_metadata = os.path.join(save_dir_metadata, f"wizja_{timestamp}.json")
 
-    # Zapisz obrazek bez oznaczeń (oryginalny frame)
-    cv.imwrite(filepath_plain, frame)
+def _frame_info(frame_ref, trigger_ts, observe=True):
+    info = {"seq": frame_ref.seq}
+    if trigger_ts is not None:
+        offset_ms = (frame_ref.timestamp - trigger_ts) * 1000
+        info["trigger_offset_ms"] = round(offset_ms, 1)
+        if observe:
+            metrics.observe("trigger_to_frame_ms", offset_ms)
+    return info
 
-    # Zapisz obrazek z oznaczeniami
-    annotate_frame(frame, result)
-    cv.imwrite(filepath_ann, frame)
 
-    # Zapis metadanych
-    with open(filepath_metadata, "w") as f:
-        json.dump(result, f)
+def _analyze(capture, contours, circles, stages=None):
+    """Klatka z `capture()` przeanalizowana potokiem (bez adnotacji i zapisu).
+    Zwraca `FrameContext`; `frame_ref` jest None, gdy nie było klatki."""
+    ctx = FrameContext(capture=capture)
+    enabled = enabled_stages(
+        contours, circles, annotate=False, capture=True, stages=stages
+    )
+    return vision_pipeline.run(ctx, enabled)
+
+
+def _persist(ctx, stages=None):
+    if "persist" in enabled_stages(circles=False, persist=True, stages=stages):
+        vision_pipeline.run(ctx, {"persist"})
+
+
+def _vote(
+    camera,
+    contours,
+    circles,
+    stop_event,
+    trigger_ts,
+    settle_delay,
+    frames,
+    agree,
+    stages=None,
+):
+    """Głosowanie na kolejnych klatkach z bufora kamery.
+
+    Kamera zapisuje do bufora w osobnym wątku, więc kolejne klatki są
+    przechwytywane w trakcie detekcji na poprzedniej - bierzemy zawsze
+    najstarszą klatkę nowszą od ostatnio analizowanej. Kończymy, gdy `agree`
+    klatek da ten sam wynik albo po `frames` klatkach (wygrywa najczęstszy).
+    Zwraca `FrameContext` ostatniej klatki ze zwycięskim wynikiem.
+    """
+    votes = Counter()
+    winners = {}  # klucz -> FrameContext ostatniej klatki z tym wynikiem
+    order = []  # klucze w kolejności pierwszego wystąpienia (remisy)
+    analyzed = 0
+    frame_ref = None
+    try:
+        while analyzed < frames:
+            if stop_event and stop_event.is_set():
+                break
+            if frame_ref is None:
+                capture = lambda: _first_frame(  # noqa: E731
+                    camera, trigger_ts, settle_delay
+                )
+            else:
+                capture = lambda: camera.first_after(frame_ref.timestamp)  # noqa: E731
+            ctx = _analyze(capture, contours, circles, stages)
+            frame_ref = ctx.frame_ref
+            if frame_ref is None:
+                break
+            analyzed += 1
+            result = ctx.results
+            result["frame"] = _frame_info(frame_ref, trigger_ts, analyzed == 1)
+            key = verdict_key(result)
+            votes[key] += 1
+            if key not in winners:
+                order.append(key)
+            else:
+                winners[key].frame_ref.release()
+            winners[key] = ctx
+            if votes[key] >= agree:
+                break
+
+        if not votes:
+            return None
+        best = max(order, key=lambda key: votes[key])
+        ctx = winners.pop(best)
+    finally:
+        for other in winners.values():
+            other.frame_ref.release()
+
+    confidence = votes[best] / analyzed
+    ctx.results["vote"] = {
+        "frames": analyzed,
+        "agree": votes[best],
+        "confidence": round(confidence, 2),
+    }
+    metrics.observe("vote_frames", analyzed)
+    metrics.observe("vote_confidence", confidence)
+    return ctx
 
 
 def wizja_still(
@@ -57,66 +137,154 @@ def wizja_still(
     save_image=True,
     camera=None,
     stop_event=None,
+    trigger_ts=None,
+    settle_delay=ANALYSIS_SETTLE_DELAY,
+    voting_frames=STILL_VOTING_FRAMES,
+    voting_agree=STILL_VOTING_AGREE,
+    stages=None,
 ):
+    """Analiza pojedynczej klatki.
+
+    `trigger_ts` to chwila (`time.monotonic()`) odczytu żądania analizy z PLC.
+    Jeśli jest podana, analizowana jest pierwsza klatka wykonana po
+    `trigger_ts + settle_delay` (element zdążył się zatrzymać), a przesunięcie
+    klatki względem wyzwolenia trafia do wyniku (`result["frame"]`).
+
+    Przy `voting_frames` > 1 wynik jest ustalany głosowaniem na kolejnych
+    klatkach (patrz `_vote`), a `result["vote"]["confidence"]` to odsetek
+    klatek zgodnych ze zwycięskim wynikiem.
+
+    `stages` ogranicza etapy potoku (domyślnie `PIPELINE_STAGES`); czasy
+    etapów od pobrania klatki do zapisu są w `result["pipeline"]`.
+    """
 
     camera_initialized_here = False
 
     if camera is None:
         camera_initialized_here = True
         camera = Camera()
-    stats = Stats()
-    stats.inc("wizja_still_calls")
+    get_stats().inc("wizja_still_calls")
 
     cancelled = False
-    frame = None
+    ctx = None
     result = None
     try:
-        repetition = 0
-        # Wykrywanie obiektów, aż do momentu, gdy zostaną wykryte kółka lub przekroczymy limit klatek
-        while (
-            repetition < STILL_REPETITION_LIMIT
-            and circles
-            and (not result or not result.get("circles"))
-        ):
-            if stop_event and stop_event.is_set():
-                cancelled = True
-                break
-            frame = camera.get_frame()
-            if frame is None:
+        if voting_frames > 1:
+            ctx = _vote(
+                camera,
+                contours,
+                circles,
+                stop_event,
+                trigger_ts,
+                settle_delay,
+                voting_frames,
+                min(voting_agree, voting_frames),
+                stages,
+            )
+            cancelled = stop_event is not None and stop_event.is_set()
+            if ctx is None and cancelled:
+                # Przerwane przed pierwszym głosem - to nie jest błąd kamery
+                return None
+            if ctx is None:
                 print("Can't receive frame")
                 logger.error("Can't receive frame")
                 return None
-            repetition += 1
-            result = find_objects(
-                frame, contours=contours, circles=circles, annotate=False
-            )
+            result = ctx.results
+        else:
+            repetition = 0
+            # Wykrywanie obiektów, aż do momentu, gdy zostaną wykryte kółka lub przekroczymy limit klatek
+            while (
+                repetition < STILL_REPETITION_LIMIT
+                and circles
+                and (not result or not result.get("circles"))
+            ):
+                if stop_event and stop_event.is_set():
+                    cancelled = True
+                    break
+                # Klatka prosto z bufora kamery (bez kopiowania); przy kolejnej
+                # próbie czekamy na nowszą klatkę niż poprzednio analizowana
+                previous = ctx
+                if previous is None:
+                    capture = lambda: _first_frame(  # noqa: E731
+                        camera, trigger_ts, settle_delay
+                    )
+                else:
+                    capture = lambda: camera.wait_next(  # noqa: E731
+                        after_seq=previous.frame_ref.seq
+                    )
+                ctx = _analyze(capture, contours, circles, stages)
+                if previous is not None:
+                    previous.frame_ref.release()
+                if ctx.frame_ref is None:
+                    ctx = None
+                    print("Can't receive frame")
+                    logger.error("Can't receive frame")
+                    return None
+                repetition += 1
+                result = ctx.results
+                result["frame"] = _frame_info(ctx.frame_ref, trigger_ts)
+
+        if not cancelled and save_image and ctx is not None:
+            # Zapis na dysk w tle - wynik wraca do PLC bez czekania na kartę SD
+            _persist(ctx, stages)
     finally:
+        if ctx is not None:
+            ctx.frame_ref.release()
         if camera_initialized_here:
             camera.release()
 
-    if cancelled:
-        return result
+    return result
 
-    if save_image and frame is not None:
-        save_image_with_metadata(frame, result)
 
-    return result
+async def wizja_still_async(**kwargs):
+    """Uruchamia `wizja_still` w wątku wizyjnym, nie blokując pętli zdarzeń."""
+    return await run_in_vision_executor(wizja_still, **kwargs)
 
 
 def wizja_live(
     contours=False,  # Czy wykrywać kontury
     circles=True,  # Czy wykrywać kółka
     camera=None,  # Obiekt kamery (jeśli None, zostanie utworzony nowy)
+    track=True,  # Czy śledzić koła między klatkami (stałe ID, okna zamiast całej ramki)
+    gate=GATE_ENABLED,  # Czy pomijać detekcję na klatkach bez zmian / z pustym pasem
+    stages=None,  # Dozwolone etapy potoku (None = PIPELINE_STAGES z konfiguracji)
 ):
     if not camera:
         camera = Camera()
+    tracker = CircleTracker() if circles and track else None
+    motion_gate = MotionGate() if gate else None
     while True:
         frame = camera.get_frame()
         if frame is None:
             print("Can't receive frame")
             break
+        prepared = prepare_frame(frame)
+
+        def detect():
+            results = find_objects(
+                frame,
+                contours=contours,
+                circles=circles and tracker is None,
+                annotate=False,
+                prepared=prepared,
+                stages=stages,
+            )
+            if tracker is not None:
+                results["circles"] = tracker.update(frame, prepared=prepared)
+            return results
+
         # Wykrywanie obiektów
-        find_objects(frame, contours=contours, circles=circles)
+        if motion_gate is None:
+            results = detect()
+        else:
+            results, _skipped = motion_gate.run(frame, detect, prepared=prepared)
+        annotate_frame(frame, results, prepared=prepared)
+        if tracker is not None:
+            put_text_with_shadow(frame, f"Parts: {tracker.parts}", (10, 100))
+        if motion_gate is not None:
+            put_text_with_shadow(
+                frame, f"Skipped: {motion_gate.skip_ratio:.0%}", (10, 135)
+            )
         cv.imshow("Obraz z kamery", frame)
         # cv.imshow("Krawedzie", krawedzie)
         if cv.waitKey(1) == ord("q"):
@@ -125,26 +293,20 @@ def wizja_live(
     cv.destroyAllWindows()
 
 
-def find_objects(frame, contours=False, circles=True, annotate=True):
-    results = {}
-    # Wyliczanie szerokości i wysokości ramki na podstawie rozmiaru obrazu
-    frame_h, frame_w = frame.shape[:2]
-    FRAME_WIDTH = frame_w - FRAME_LEFT_MARGIN - FRAME_RIGHT_MARGIN
-    FRAME_HEIGHT = frame_h - FRAME_TOP_MARGIN - FRAME_BOTTOM_MARGIN
-    # Rysowanie ramki kadrowania na obrazie
-    results["contours"] = [[], []]
-    results["circles"] = []
-    if contours:
-        results["contours"] = detect_contours(
-            frame, FRAME_LEFT_MARGIN, FRAME_TOP_MARGIN, FRAME_WIDTH, FRAME_HEIGHT
-        )
-    if circles:
-        results["circles"] = detect_circles(
-            frame, FRAME_LEFT_MARGIN, FRAME_TOP_MARGIN, FRAME_WIDTH, FRAME_HEIGHT
-        )
-    if annotate:
-        annotate_frame(frame, results)
-    return results
+def find_objects(
+    frame,
+    contours=False,
+    circles=True,
+    annotate=True,
+    roi=None,
+    prepared=None,
+    stages=None,
+):
+    """Analiza podanej klatki etapami potoku (patrz `src.pipeline`); czasy
+    etapów są w `result["pipeline"]`."""
+    ctx = FrameContext(frame, roi=roi, prepared=prepared)
+    enabled = enabled_stages(contours, circles, annotate, stages=stages)
+    return vision_pipeline.run(ctx, enabled).results
 
 
 if __name__ == "__main__":